@@ -0,0 +1,111 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Cold-start profile of the controller process: wall time and peak RSS of importing a module in a
+fresh interpreter, and the modules with the highest cumulative import time (python -X importtime,
+Python 3.7 or later). Run from the client-connector directory:
+
+    python benchmarks/bench_import.py --top 25 --output results/import_profile.txt
+
+The raw -X importtime report is saved with --output, to be compared across versions.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "modules": len(sys.modules)}))
+sys.stdout.flush()
+"""
+
+
+def parse_importtime(report: str) -> list:
+
+    """
+    (cumulative us, self us, module) of each line of a -X importtime report
+    """
+
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        rows.append((int(fields[1]), int(fields[0]), fields[2].rstrip()))
+    return rows
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='cc_controller', help='module to import')
+    parser.add_argument('--top', type=int, default=25, help='modules with the highest cumulative time to show')
+    parser.add_argument('--output', default=None, help='file receiving the raw -X importtime report')
+    args = parser.parse_args()
+
+    if not os.path.exists('app.ini'):
+        parser.error('run from the client-connector directory')
+
+    start = time.monotonic()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE % args.module],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    wall = time.monotonic() - start
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        sys.exit('Importing %s failed' % args.module)
+
+    probe = json.loads(completed.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(completed.stderr)
+
+    print('module:            %s' % args.module)
+    print('interpreter wall:  %.3f s' % wall)
+    print('import time:       %.3f s' % probe["seconds"])
+    print('peak RSS:          %.1f MB' % (probe["maxrss_kb"] / 1024.0))
+    print('modules loaded:    %d' % probe["modules"])
+
+    if not rows:
+        print('(no -X importtime report: Python 3.7 or later is needed for the per-module profile)')
+        return
+
+    print('\n%12s %12s  %s' % ('cumul_ms', 'self_ms', 'module'))
+    for cumulative, own, module in sorted(rows, reverse=True)[:args.top]:
+        print('%12.1f %12.1f  %s' % (cumulative / 1000.0, own / 1000.0, module))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as report:
+            report.write(completed.stderr)
+        print('\nraw report saved to %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Launch latency of master.py and worker.py, cold (a new interpreter importing everything) versus
+warm (handed to a pre-started warm_worker.py interpreter). Run from the client-connector directory:
+
+    python benchmarks/bench_launch.py --repeat 3
+
+Each launch runs the script with --help, so it stops right after its imports and argument
+parsing: the measured time is the start-up cost paid before any training round.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def cold(script: str) -> float:
+
+    start = time.monotonic()
+    subprocess.run([sys.executable, script, '--help'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    return time.monotonic() - start
+
+
+def warm(script: str):
+
+    process = subprocess.Popen([sys.executable, 'warm_worker.py'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    line = process.stdout.readline()
+    while line and not line.startswith(b'ready'):
+        line = process.stdout.readline()
+    if not line:
+        raise RuntimeError('warm_worker.py exited with %s' % process.wait())
+    preload = float(line.split()[1])
+
+    start = time.monotonic()
+    process.communicate((json.dumps({"argv": [script, '--help']}) + '\n').encode('utf-8'))
+    if process.returncode != 0:
+        raise RuntimeError('%s exited with %s on the warm interpreter' % (script, process.returncode))
+    return time.monotonic() - start, preload
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scripts', default='master.py,worker.py')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.path.exists('warm_worker.py'):
+        parser.error('run from the client-connector directory')
+
+    print('%-10s %10s %10s %10s %9s' % ('script', 'cold_s', 'warm_s', 'preload_s', 'speedup'))
+    for script in args.scripts.split(','):
+        colds = [cold(script) for _ in range(args.repeat)]
+        warms, preloads = zip(*[warm(script) for _ in range(args.repeat)])
+        cold_s, warm_s = statistics.median(colds), statistics.median(warms)
+        print('%-10s %10.3f %10.3f %10.3f %8.1fx' % (script, cold_s, warm_s, statistics.median(preloads),
+                                                       cold_s / warm_s if warm_s else float('inf')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Startup time and throughput of the Client Connector with the development server and with gunicorn.
+Run from the client-connector directory:
+
+    python benchmarks/bench_server.py --requests 2000 --concurrency 16
+
+Each server is started in turn on a free local port, timed until it accepts connections, then
+loaded with concurrent GET requests on an endpoint that needs no login.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+SERVERS = {
+    'dev': lambda port: [sys.executable, '-c',
+                         "from cc_controller import app; app.run(threaded=True, host='127.0.0.1', port=%d)" % port],
+    'gunicorn': lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                              '-b', '127.0.0.1:%d' % port, 'wsgi:app'],
+}
+
+
+def free_port() -> int:
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port: int, process, timeout: float) -> float:
+
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError('Server exited with code %d' % process.returncode)
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return time.monotonic() - start
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Server not ready after %.0fs' % timeout)
+
+
+def get(url: str) -> float:
+
+    start = time.monotonic()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.monotonic() - start
+
+
+def percentile(values: list, fraction: float) -> float:
+
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(name: str, args) -> dict:
+
+    port = free_port()
+    url = 'http://127.0.0.1:%d%s' % (port, args.path)
+    process = subprocess.Popen(SERVERS[name](port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        startup = wait_ready(port, process, args.startup_timeout)
+        for _ in range(args.warmup):
+            get(url)
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            latencies = sorted(executor.map(lambda _: get(url), range(args.requests)))
+        elapsed = time.monotonic() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {'server': name, 'startup_s': startup, 'rps': args.requests / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default='dev,gunicorn', help='comma separated: ' + ', '.join(SERVERS))
+    parser.add_argument('--path', default='/cc/configurations/step')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    if not os.path.exists('app.ini'):
+        parser.error('run from the client-connector directory')
+
+    print('%-10s %10s %10s %9s %9s %9s' % ('server', 'startup_s', 'req/s', 'p50_ms', 'p95_ms', 'p99_ms'))
+    for name in args.servers.split(','):
+        result = run(name.strip(), args)
+        print('%(server)-10s %(startup_s)10.2f %(rps)10.1f %(p50_ms)9.1f %(p95_ms)9.1f %(p99_ms)9.1f' % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,7 @@ from utils.encoders import JSONEncoder
 from flask_mongoengine import MongoEngine
 
 import pika
+import functools
 import json
 import uuid
 import logging
@@ -59,18 +60,29 @@ config = configparser.ConfigParser()
 config.read('app.ini')
 
 credentials = config["LIBRARIES"]["CONFIG_PATH"]
-user_obj = None
 
 from services.comms import users, models
 from services.comms.tasks import Tasks
 from services.cc import dataset, configuration
+from services.cc.sessions import SessionStore
 from services.catalogue import catalogue
 from services.fml import running_subprocess
-from utils import charts_utils, platform_utils, logger
+from services.fml.scheduler import JobScheduler
+from services.fml.supervisor import SUPERVISOR
+from services.fml.warm_pool import WARM_POOL
+from utils import charts_utils, platform_utils, logger, log_index, metrics_log
+from utils.http_utils import conditional_compressed
 from utils.error_utils import RegistrationError
 from communication_abstract_interface import ServerException, MalformedResponseException, DispatchException, BadNotificationException, TaskException
 from user import User
 
+# Logged users by session id
+sessions = SessionStore()
+
+# Queue of the aggregator and participant launches, started on pre-warmed interpreters when available
+# (the warm pool starts them on the first launch)
+scheduler = JobScheduler()
+
 """
 ERRORS HANDLER
 """
@@ -153,14 +165,17 @@ def before_request():
 
         logging.info("Preflight OPTIONS")
 
-    elif 'user_id' in session and user_obj is not None:
-        if user_obj.id == session['user_id']:
-            g.user = user_obj
+    else:
+
+        if 'user_id' in session:
+            g.user = sessions.get(session['user_id'])
+
+        if g.user is not None:
             logging.info('User already logged: ' + str(g.user))
 
-    elif request.endpoint not in endpoints:
-        logging.info("Unauthorized..")
-        return Response('Unauthorized', 401)
+        elif request.endpoint not in endpoints:
+            logging.info("Unauthorized..")
+            return Response('Unauthorized', 401)
 
 
 """
@@ -177,7 +192,8 @@ def after_request(response):
     header["Access-Control-Allow-Origin-Methods"] = "GET,POST,OPTIONS"
     # header["Access-Control-Allow-Origin"] = "*"
 
-    return response
+    # ETag / 304 for unchanged payloads and compression of the large ones
+    return conditional_compressed(request, response)
 
 
 """
@@ -288,7 +304,12 @@ def get_result_task_log_stream_json():
     task_name = request.args.get('task')
     mode = request.args.get('mode')  # participant or aggregator
 
-    response = Response(logger.get_log_stream(user, mode, task_name), mimetype='text/event-stream')
+    # Set by the browsers when they reconnect: the stream resumes after the last event received
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    if last_event_id is not None and not last_event_id.isdigit():
+        last_event_id = None
+
+    response = Response(logger.get_log_stream(user, mode, task_name, last_event_id), mimetype='text/event-stream')
     response.headers.add_header('Cache-Control', 'no-cache')
     response.headers.add_header('Connection', 'keep-alive')
 
@@ -318,9 +339,44 @@ def get_result_task_log_batch():
     task_name = request.args.get('task')
     mode = request.args.get('mode')  # participant or aggregator
 
+    # Paginated reads, through the line index of the log
+    page = {}
+    try:
+        for name in ('offset', 'limit', 'start_line', 'lines', 'tail'):
+            if request.args.get(name) is not None:
+                page[name] = int(request.args.get(name))
+        if request.args.get('level') is not None:
+            page['level'] = log_index.parse_level(request.args.get('level'))
+    except ValueError as err:
+        return json.dumps({'message': 'Bad pagination parameter: ' + str(err)}), 400, {'ContentType': 'application/json'}
+
+    if page:
+        return json.dumps(log_index.get_log_page(user, mode, task_name, **page)), 200, \
+            {'ContentType': 'application/json'}
+
     return json.dumps(logger.get_log_batch(user, mode, task_name)), 200, {'ContentType': 'application/json'}
 
 
+@app.route('/cc/results/metrics', methods=['GET'])
+@cross_origin()
+def get_result_task_metrics():
+
+    user = g.user.username
+    task_name = request.args.get('task')
+    mode = request.args.get('mode')  # participant or aggregator
+    fields = request.args.get('fields')  # comma separated, all by default
+
+    try:
+        points = int(request.args.get('points', metrics_log.DEFAULT_POINTS))
+    except ValueError as err:
+        return json.dumps({'message': 'Bad points parameter: ' + str(err)}), 400, {'ContentType': 'application/json'}
+
+    series = metrics_log.read_series(metrics_log.metrics_path(user, mode, task_name),
+                                     fields.split(',') if fields else None, points)
+
+    return json.dumps(series), 200, {'ContentType': 'application/json'}
+
+
 @app.route('/cc/datasets', methods=['POST'])
 def add_dataset():
 
@@ -367,10 +423,14 @@ def login_user():
 
     if users.login(credentials, user, password):
 
-        user_id = uuid.uuid4()
+        if 'user_id' in session:
+            sessions.remove(session['user_id'])
+
+        user_id = str(uuid.uuid4())
         session['user_id'] = user_id
-        global user_obj
-        user_obj = User(id=user_id, username=user, password=password)
+        user_obj = User(id=user_id, username=user, password=password, credentials=credentials)
+        user_obj.client  # the platform client is opened once and shared by the requests of the session
+        sessions.put(user_obj)
         logging.info('User logged: ' + str(user_obj.username))
 
     return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
@@ -383,7 +443,7 @@ def get_status():
     username = g.user.username
     password = g.user.password
 
-    if users.status(credentials, username, password):
+    if users.status(credentials, username, password, client=g.user.client):
 
         return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
@@ -396,9 +456,8 @@ def get_status():
 @cross_origin()
 def logout_user():
 
-    del session['user_id']
-    global user_obj
-    user_obj = None
+    if 'user_id' in session:
+        sessions.remove(session.pop('user_id'))
 
     return json.dumps({'success': True}), 200
 
@@ -427,7 +486,13 @@ def change_password():
 
     new_password = data['new_password']
 
-    users.change_password(credentials=credentials, username=username, password=password, new_password=new_password)
+    users.change_password(credentials=credentials, username=username, password=password, new_password=new_password,
+                          client=g.user.client)
+
+    # The session client was opened with the old password
+    g.user.password = new_password
+    g.user.close()
+    sessions.put(g.user)
 
     return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
@@ -438,11 +503,9 @@ def deregister_user():
     username = g.user.username
     password = g.user.password
 
-    users.deregister(credentials=credentials, username=username, password=password)
+    users.deregister(credentials=credentials, username=username, password=password, client=g.user.client)
 
-    del session['user_id']
-    global user_obj
-    user_obj = None
+    sessions.remove(session.pop('user_id'))
 
     return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
@@ -456,7 +519,7 @@ def tasks():
 
     if request.method == 'GET':
 
-        result = Tasks(credentials=credentials, user=username, password=password).get_tasks()
+        result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).get_tasks()
 
     elif request.method == 'POST':
 
@@ -472,7 +535,7 @@ def tasks():
         else:
             topology = 'STAR'
 
-        result = Tasks(credentials=credentials, user=username, password=password).\
+        result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).\
             add_task(task_name, task_definition, topology)
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
@@ -487,11 +550,11 @@ def task(task_name):
 
     if request.method == 'GET':
 
-        result = Tasks(credentials=credentials, user=username, password=password).get_task_info(task_name)
+        result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).get_task_info(task_name)
 
     elif request.method == 'DELETE':
 
-        result = Tasks(credentials=credentials, user=username, password=password).delete_task(task_name)
+        result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).delete_task(task_name)
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
 
@@ -503,7 +566,7 @@ def get_created_task():
     username = g.user.username
     password = g.user.password
 
-    result = Tasks(credentials=credentials, user=username, password=password).get_created_tasks()
+    result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).get_created_tasks()
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
 
@@ -515,7 +578,7 @@ def get_joined_task():
     username = g.user.username
     password = g.user.password
 
-    result = Tasks(credentials=credentials, user=username, password=password).get_joined_tasks()
+    result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).get_joined_tasks()
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
 
@@ -526,7 +589,7 @@ def get_user_assignments():
     username = g.user.username
     password = g.user.password
 
-    tasks = Tasks(credentials=credentials, user=username, password=password).get_user_assignments()
+    tasks = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).get_user_assignments()
 
     return json.dumps(tasks), 200, {'ContentType': 'application/json'}
 
@@ -537,7 +600,8 @@ def get_models():
     username = g.user.username
     password = g.user.password
 
-    models_ = models.get_models(credentials=credentials, user=username, password=password)
+    models_ = models.get_models(credentials=credentials, user=username, password=password,
+                                client=g.user.client)
 
     return json.dumps(models_), 200, {'ContentType': 'application/json'}
 
@@ -550,7 +614,8 @@ def get_model(task_name):
 
     extension = request.args.get('extension')
 
-    model = models.get_model(credentials=credentials, user=username, password=password, task_name=task_name)
+    model = models.get_model(credentials=credentials, user=username, password=password, task_name=task_name,
+                             client=g.user.client)
     response = models.save_model(model, task_name, extension, username.lower())
 
     return response
@@ -562,7 +627,8 @@ def delete_model(task_name):
     username = g.user.username
     password = g.user.password
 
-    models.delete_model(credentials=credentials, user=username, password=password, task_name=task_name)
+    models.delete_model(credentials=credentials, user=username, password=password, task_name=task_name,
+                        client=g.user.client)
 
     return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
@@ -573,7 +639,8 @@ def model_lineage(task_name):
     username = g.user.username
     password = g.user.password
 
-    result = models.model_lineage(credentials=credentials, user=username, password=password, task_name=task_name)
+    result = models.model_lineage(credentials=credentials, user=username, password=password, task_name=task_name,
+                                  client=g.user.client)
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
 
@@ -592,7 +659,7 @@ def join_task():
     password = g.user.password
     task_name = data['task_name']
 
-    result = Tasks(credentials=credentials, user=username, password=password).join_task(task_name=task_name)
+    result = Tasks(credentials=credentials, user=username, password=password, client=g.user.client).join_task(task_name=task_name)
 
     return json.dumps(result), 200, {'ContentType': 'application/json'}
 
@@ -607,10 +674,13 @@ def aggregate_task():
     task_name = data['task_name']
     datasets = json.dumps(data['datasets'])
 
-    # Run the aggregator
-    running_subprocess.AggregatorSubProcessV2(credentials, username, password, task_name, datasets).run()
+    # Queue the aggregator
+    tasks_ = Tasks(credentials=credentials, user=username, password=password, client=g.user.client)
+    describe = functools.partial(tasks_.prepare_launch, task_name)
+    job = scheduler.submit(running_subprocess.AggregatorSubProcessV2(credentials, username, password, task_name, datasets),
+                           "aggregator", prepare=describe)
 
-    return json.dumps({"message": "Task " + str(task_name) + " started as aggregator."}), 200, {'ContentType': 'application/json'}
+    return json.dumps({"message": "Task " + str(task_name) + " started as aggregator.", "job_id": job.id}), 200, {'ContentType': 'application/json'}
 
 
 @app.route('/cc/fml/participate', methods=['POST'])
@@ -623,13 +693,54 @@ def participate_task():
     task_name = data['task_name']
     datasets = json.dumps(data['datasets'])
 
-    # Join the task
-    Tasks(credentials=credentials, user=username, password=password).join_task(task_name=task_name)
+    # Queue the participant, the task is joined right before the launch
+    tasks_ = Tasks(credentials=credentials, user=username, password=password, client=g.user.client)
+    join = functools.partial(tasks_.prepare_launch, task_name, join=True)
+    job = scheduler.submit(running_subprocess.ParticipantSubProcessV2(credentials, username, password, task_name, datasets),
+                           "participant", prepare=join)
+
+    return json.dumps({"message": "Task " + str(task_name) + " started as participant.", "job_id": job.id}), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/cc/fml/jobs', methods=['GET'])
+def get_jobs():
+
+    jobs = [job.to_dict() for job in scheduler.jobs(user=g.user.username)]
+
+    return json.dumps({'jobs': jobs, 'scheduler': scheduler.stats(), 'warm_pool': WARM_POOL.stats()}), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/cc/fml/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job(job_id):
+
+    job_ = scheduler.get(job_id)
+    if job_ is None or job_.user != g.user.username:
+        return json.dumps({'success': False, 'message': 'Unknown job ' + job_id}), 404, {'ContentType': 'application/json'}
+
+    if request.method == 'DELETE':
+        scheduler.cancel(job_id)
+
+    return json.dumps(job_.to_dict()), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/cc/fml/processes', methods=['GET'])
+def get_processes():
+
+    task_name = request.args.get('task_name')
+    samples = request.args.get('samples', 'false').lower() == 'true'
+
+    processes = [record.to_dict(samples=samples)
+                 for record in SUPERVISOR.records(user=g.user.username, task_name=task_name)]
+
+    return json.dumps({'processes': processes}), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/cc/fml/processes/<task_name>', methods=['GET'])
+def get_task_processes(task_name):
 
-    # Run the participant
-    running_subprocess.ParticipantSubProcessV2(credentials, username, password, task_name, datasets).run()
+    processes = SUPERVISOR.history_of(task_name, user=g.user.username)
 
-    return json.dumps({"message": "Task " + str(task_name) + " started as participant."}), 200, {'ContentType': 'application/json'}
+    return json.dumps({'processes': processes}), 200, {'ContentType': 'application/json'}
 
 
 if __name__ == '__main__':
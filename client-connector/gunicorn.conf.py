@@ -0,0 +1,85 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Gunicorn settings of the production server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every value can be overridden through the environment (CC_BIND, CC_THREADS, ...).
+The 'gthread' worker serves each request on its own thread, so long-lived log streams (SSE)
+only hold a thread and not a whole worker. Send SIGHUP to the master for a graceful reload.
+
+The server runs a single worker: the launch queue, the supervised processes and the warm
+interpreters (services/fml) live in the memory of the worker process, so with several workers
+a job would only be known, and limited, by the worker that launched it.
+"""
+
+import logging
+import os
+
+
+bind = os.environ.get('CC_BIND', '0.0.0.0:5000')
+
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('CC_THREADS', 32))
+
+# Worker heartbeat; streamed responses are not bound by it with the threaded worker
+timeout = int(os.environ.get('CC_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('CC_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('CC_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound the memory held by long-running processes
+max_requests = int(os.environ.get('CC_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('CC_MAX_REQUESTS_JITTER', 0))
+
+# The app is imported by the worker after the fork, so the worker opens its own MongoDB
+# connection (MONGODB_CONNECT is False: it is opened lazily on the first query)
+preload_app = False
+
+accesslog = os.environ.get('CC_ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.environ.get('CC_LOG_LEVEL', 'info')
+
+
+def _single_worker(server):
+
+    # Also when more workers are asked for on the command line (-w) or through CC_WORKERS
+    requested = max(server.cfg.workers, int(os.environ.get('CC_WORKERS', 1)))
+    if requested > 1:
+        logging.getLogger('gunicorn.error').warning(
+            'Running 1 worker instead of %d: launch jobs, supervised processes and warm interpreters '
+            'are kept in the worker process; use CC_THREADS for more concurrent requests', requested)
+    server.cfg.set('workers', 1)
+    server.num_workers = 1
+
+
+def on_starting(server):
+
+    _single_worker(server)
+
+
+def on_reload(server):
+
+    _single_worker(server)
@@ -25,6 +25,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from data_connector.data_connector import CsvConnector, PklConnector
 from utils.charts_utils import create_chart
 from utils.compressor import decompress_data_descriptions
+from utils.metrics_log import MetricsLog, MeteredComms, ValidationMetricsHandler, metrics_path
 from communication import create_aggregator_communication, wait_for_workers_to_join
 from services.cc.configuration import get_mmll_class_from_classpath
 from services.preprocessing import preprocessing
@@ -302,11 +303,18 @@ def main():
     # Waiting for workers to join
     wait_for_workers_to_join(comms, task_definition['quorum'])
 
+    # Round times, waits and traffic, and the validation results, recorded as metrics
+    metered_comms = MeteredComms(comms, MetricsLog(metrics_path(user, 'aggregator', task_name)), aggregator=True)
+    logger.addHandler(ValidationMetricsHandler(metered_comms))
+
     # Instantiate wrapper Communication object
-    wrapper_comms = wrapper_comms_class(comms)
+    wrapper_comms = wrapper_comms_class(metered_comms)
 
     # Run 'master' aggregator
-    run_master_node(wrapper_comms, masternode_class, task_definition, datasets, comms, task_name, user)
+    try:
+        run_master_node(wrapper_comms, masternode_class, task_definition, datasets, comms, task_name, user)
+    finally:
+        metered_comms.close()
 
 
 if __name__ == "__main__":
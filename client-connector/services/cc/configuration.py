@@ -29,6 +29,9 @@ import importlib
 import subprocess
 import sys
 
+from utils import platform_utils
+from services.fml.warm_pool import WARM_POOL
+
 LOGGER = logging.getLogger('configuration')
 LOGGER.setLevel(logging.DEBUG)
 
@@ -84,6 +87,9 @@ def set_comm_json_configurations(config_data):
     except Exception as err:
         LOGGER.error('error: %s', err)
         raise err
+    finally:
+        platform_utils.invalidate()
+        WARM_POOL.recycle()
 
 
 def set_mmll_json_configurations(config_data):
@@ -116,6 +122,9 @@ def set_mmll_json_configurations(config_data):
         LOGGER.error('error: %s', err)
         raise err
 
+    finally:
+        WARM_POOL.recycle()
+
 
 def validate_catalogue_json(algorithms):
 
@@ -33,3 +33,38 @@ class Dataset(db.DynamicDocument):
     datastorage = db.StringField(max_length=60)  # i.e. FileSystem
     format = db.StringField(max_length=60)  # i.e. csv
     module = db.StringField(max_length=60)  # i.e. CsvConnector
+
+
+class UserSession(db.Document):
+    session_id = db.StringField(primary_key=True)
+    username = db.StringField()
+    password_token = db.StringField()  # platform password, encrypted (Fernet)
+    credentials = db.StringField()
+    revision = db.StringField()  # changes whenever the session is stored again
+    expires = db.DateTimeField()  # UTC, expired sessions are purged by MongoDB
+
+    meta = {'indexes': [{'fields': ['expires'], 'expireAfterSeconds': 0}], 'strict': False}
+
+
+class TaskProcess(db.Document):
+    pid = db.IntField()
+    started = db.DateTimeField()  # UTC
+    finished = db.DateTimeField()
+    kind = db.StringField(max_length=20)  # aggregator or participant
+    user = db.StringField()
+    task_name = db.StringField()
+    job_id = db.StringField()
+    labels = db.DictField()  # i.e. algorithm_name, POM
+    state = db.StringField(max_length=20)
+    returncode = db.IntField()
+    wall_seconds = db.FloatField()
+    cpu_user_seconds = db.FloatField()
+    cpu_system_seconds = db.FloatField()
+    rss_mb = db.FloatField()
+    peak_rss_mb = db.FloatField()
+    threads = db.IntField()
+    preload_cpu_seconds = db.FloatField()  # used by the warm interpreter before the task, not in the totals
+    preload_rss_mb = db.FloatField()
+    samples = db.ListField()  # [seconds since start, CPU seconds, RSS MB]
+
+    meta = {'indexes': ['task_name', ('pid', 'started')]}
@@ -0,0 +1,268 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import collections
+import configparser
+import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+
+from user import User
+
+LOGGER = logging.getLogger('sessions')
+LOGGER.setLevel(logging.DEBUG)
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+SESSION_BACKEND = config.get("SESSION", "BACKEND", fallback="memory")  # memory or mongo
+SESSION_MAX_ENTRIES = config.getint("SESSION", "MAX_SESSIONS", fallback=256)
+SESSION_TTL = config.getint("SESSION", "TTL", fallback=8 * 3600)
+SESSION_REVALIDATE = config.getint("SESSION", "REVALIDATE", fallback=30)
+SESSION_KEY_PATH = config.get("SESSION", "KEY_PATH", fallback="configs/session.key")
+
+
+class SessionStore:
+
+    """
+    Logged users by session id: an in-memory LRU with a sliding time to live, optionally
+    backed by MongoDB so that the sessions survive restarts and are shared by the workers.
+    With MongoDB, a session kept in memory is checked against its stored revision every
+    'revalidate' seconds, so a logout or a password change on a worker reaches the others.
+    """
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL, backend=SESSION_BACKEND,
+                 revalidate=SESSION_REVALIDATE):
+
+        """
+        :param max_entries: maximum number of users kept in memory
+        :type max_entries: `int`
+        :param ttl: seconds of inactivity after which a session expires
+        :type ttl: `int`
+        :param backend: 'memory' or 'mongo'
+        :type backend: `str`
+        :param revalidate: seconds after which a session in memory is checked against MongoDB
+        :type revalidate: `int`
+        """
+
+        if backend not in ("memory", "mongo"):
+            raise ValueError("Unknown session backend: " + str(backend))
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.revalidate = revalidate
+
+        self._lock = threading.Lock()
+        self._users = collections.OrderedDict()  # session id -> (expiry, User, revision)
+        self._checked = {}  # session id -> time the stored session was last checked
+        self._cipher = None
+
+    def get(self, session_id):
+
+        """
+        Logged user of a session, None if unknown or expired.
+        :param session_id: session id
+        :type session_id: `str`
+        :rtype: :class:`user.User`
+        """
+
+        session_id = str(session_id)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._users.get(session_id)
+            if entry is not None and entry[0] > now:
+                self._users[session_id] = (now + self.ttl, entry[1], entry[2])
+                self._users.move_to_end(session_id)
+                user = entry[1]
+            else:
+                user = None
+
+        if entry is not None and user is None:
+            # Expired in this process only: the stored session, shared by the workers, is kept
+            self._forget(session_id)
+            if self.backend != "mongo":
+                return None
+
+        if self.backend == "mongo":
+            if user is not None and not self._revalidate(session_id, entry[2]):
+                # Logged out, or stored again (e.g. new password), by another worker
+                self._forget(session_id)
+                user = None
+            if user is None:
+                user = self._load(session_id)
+
+        return user
+
+    def put(self, user):
+
+        """
+        Register a logged user under its session id (user.id).
+        :param user: logged user
+        :type user: :class:`user.User`
+        """
+
+        revision = uuid.uuid4().hex
+        self._remember(str(user.id), user, revision)
+        if self.backend == "mongo":
+            self._save(user, revision)
+            with self._lock:
+                self._checked[str(user.id)] = time.monotonic()
+
+    def remove(self, session_id):
+
+        """
+        Forget a session and release the platform client of its user.
+        :param session_id: session id
+        :type session_id: `str`
+        """
+
+        session_id = str(session_id)
+        self._forget(session_id)
+
+        if self.backend == "mongo":
+            from services.cc.models import UserSession
+            UserSession.objects(session_id=session_id).delete()
+
+    def __len__(self):
+
+        with self._lock:
+            return len(self._users)
+
+    def _forget(self, session_id):
+
+        with self._lock:
+            entry = self._users.pop(session_id, None)
+            self._checked.pop(session_id, None)
+
+        if entry is not None:
+            self._close(entry[1])
+
+    def _remember(self, session_id, user, revision=None):
+
+        evicted = []
+        with self._lock:
+            previous = self._users.pop(session_id, None)
+            if previous is not None and previous[1] is not user:
+                evicted.append(previous[1])
+            self._users[session_id] = (time.monotonic() + self.ttl, user, revision)
+            while len(self._users) > self.max_entries:
+                evicted_id, (_, evicted_user, _) = self._users.popitem(last=False)
+                self._checked.pop(evicted_id, None)
+                evicted.append(evicted_user)
+
+        for old in evicted:
+            self._close(old)
+
+    @staticmethod
+    def _close(user):
+
+        try:
+            user.close()
+        except Exception as err:
+            LOGGER.warning('error closing the session of %s: %s', user, err)
+
+    def _expiry(self):
+
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+
+    def _fernet(self):
+
+        # Platform passwords are stored encrypted, with a key shared by the workers:
+        # CC_SESSION_KEY, or the key file created by the first worker
+        with self._lock:
+            if self._cipher is None:
+                from cryptography.fernet import Fernet
+
+                key = os.environ.get("CC_SESSION_KEY")
+                if not key:
+                    # Written aside and linked into place, so that the key file is never seen
+                    # empty; the link fails if another worker created it first
+                    temporary = "%s.%s.tmp" % (SESSION_KEY_PATH, uuid.uuid4().hex)
+                    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                    try:
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(Fernet.generate_key())
+                            f.flush()
+                            os.fsync(f.fileno())
+                        os.link(temporary, SESSION_KEY_PATH)
+                    except FileExistsError:
+                        pass
+                    finally:
+                        os.remove(temporary)
+                    with open(SESSION_KEY_PATH, "rb") as f:
+                        key = f.read().strip()
+                self._cipher = Fernet(key)
+            return self._cipher
+
+    def _save(self, user, revision):
+
+        from services.cc.models import UserSession
+        password_token = self._fernet().encrypt(user.password.encode("utf-8")).decode("ascii")
+        UserSession(session_id=str(user.id), username=user.username, password_token=password_token,
+                    credentials=user.credentials, revision=revision, expires=self._expiry()).save()
+
+    def _load(self, session_id):
+
+        from cryptography.fernet import InvalidToken
+        from services.cc.models import UserSession
+
+        stored = UserSession.objects(session_id=session_id, expires__gt=datetime.datetime.utcnow()).first()
+        if stored is None:
+            return None
+
+        try:
+            password = self._fernet().decrypt(stored.password_token.encode("ascii")).decode("utf-8")
+        except (InvalidToken, AttributeError):
+            LOGGER.warning('Stored session %s cannot be decrypted, dropped', session_id)
+            stored.delete()
+            return None
+
+        user = User(id=session_id, username=stored.username, password=password, credentials=stored.credentials)
+        self._remember(session_id, user, stored.revision)
+        self._revalidate(session_id, stored.revision)
+        return user
+
+    def _revalidate(self, session_id, revision):
+
+        """
+        Check that the stored session is still the one in memory, refreshing its expiry;
+        done every 'revalidate' seconds, not on every request
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(session_id)
+            if checked is not None and now - checked < self.revalidate:
+                return True
+            self._checked[session_id] = now
+
+        from services.cc.models import UserSession
+        updated = UserSession.objects(session_id=session_id, revision=revision,
+                                      expires__gt=datetime.datetime.utcnow()).update(expires=self._expiry())
+        return updated > 0
@@ -25,7 +25,6 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from utils import platform_utils as utils
 
 import logging
-import communication_abstract_interface as ffl
 import os
 import json
 
@@ -34,12 +33,11 @@ LOGGER = logging.getLogger('comms.models')
 LOGGER.setLevel(logging.DEBUG)
 
 
-def get_models(credentials, user, password):
+def get_models(credentials, user, password, client=None):
 
     try:
 
-        context = utils.platform(credentials, user, password)
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, user, password, client)
 
         with user:
             models = user.get_models()
@@ -53,10 +51,9 @@ def get_models(credentials, user, password):
         raise err
 
 
-def get_model(credentials, user, password, task_name):
+def get_model(credentials, user, password, task_name, client=None):
 
-    context = utils.platform(credentials, user, password)
-    user = ffl.Factory.user(context)
+    user = utils.platform_user(credentials, user, password, client)
 
     # with graph.as_default():
     with user:
@@ -85,12 +82,11 @@ def save_model(model, task_name, extension, username):
         return json.dumps({'success': False, "message": str(err)}), 500, {'ContentType': 'application/json'}
 
 
-def delete_model(credentials, user, password, task_name):
+def delete_model(credentials, user, password, task_name, client=None):
 
     try:
 
-        context = utils.platform(credentials, user, password)
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, user, password, client)
 
         with user:
             result = user.delete_model(task_name)
@@ -105,12 +101,11 @@ def delete_model(credentials, user, password, task_name):
         raise err
 
 
-def model_lineage(credentials, user, password, task_name):
+def model_lineage(credentials, user, password, task_name, client=None):
 
     try:
 
-        context = utils.platform(credentials, user, password)
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, user, password, client)
 
         with user:
             result = user.model_lineage(task_name)
@@ -26,7 +26,6 @@ from utils import platform_utils as utils
 from utils.compressor import compress_data_descriptions, decompress_data_descriptions
 
 import logging
-import communication_abstract_interface as ffl
 import json
 import os.path
 
@@ -43,11 +42,16 @@ LOGGER.setLevel(logging.DEBUG)
 
 class Tasks:
 
-    def __init__(self, credentials, user, password):
+    def __init__(self, credentials, user, password, client=None):
 
         self.credentials = credentials
         self.user = user
         self.password = password
+        self.client = client
+
+    def _platform_user(self):
+
+        return utils.platform_user(self.credentials, self.user, self.password, self.client)
 
     def get_tasks(self):
 
@@ -60,8 +64,7 @@ class Tasks:
         """
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 tasks = user.get_tasks()
@@ -80,8 +83,7 @@ class Tasks:
     def get_task_info(self, task_name):
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 task = user.task_info(task_name)
@@ -178,8 +180,7 @@ class Tasks:
         """
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 created_tasks = user.get_created_tasks()
@@ -202,8 +203,7 @@ class Tasks:
         """
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 joined_tasks = user.get_joined_tasks()
@@ -235,8 +235,7 @@ class Tasks:
 
         try:
 
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 result = user.create_task(task_name, topology, task_definition)
@@ -265,8 +264,7 @@ class Tasks:
 
         try:
 
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 return user.get_joined_tasks()
@@ -290,8 +288,7 @@ class Tasks:
         """
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
             with user:
                 return user.join_task(task_name)
                 LOGGER.debug('joined task')
@@ -303,8 +300,7 @@ class Tasks:
     def delete_task(self, task_name):
 
         try:
-            context = utils.platform(self.credentials, self.user, self.password)
-            user = ffl.Factory.user(context)
+            user = self._platform_user()
 
             with user:
                 return user.delete_task(task_name)
@@ -312,3 +308,35 @@ class Tasks:
         except Exception as err:
             LOGGER.error('error: %s', err)
             raise err
+
+    def prepare_launch(self, task_name, join=False):
+
+        """
+        Run before launching the aggregator or a participant of a task: join the task if
+        requested, and describe it for the records of the launched process.
+        Throws: An exception on failure (of the join)
+        :param task_name: name of the task.
+        :type task_name: `str`
+        :param join: join the task as participant.
+        :type join: `bool`
+        :return: algorithm name and POM of the task (empty if not available).
+        :rtype: `dict`
+        """
+
+        if join:
+            self.join_task(task_name)
+
+        try:
+            user = self._platform_user()
+
+            with user:
+                task = user.task_info(task_name)
+
+            definition = task["definition"]
+            if isinstance(definition, str):
+                definition = json.loads(definition)
+            return {"algorithm_name": definition.get("algorithm_name"), "POM": definition.get("POM")}
+
+        except Exception as err:
+            LOGGER.warning('No description of task %s: %s', task_name, err)
+            return {}
@@ -61,12 +61,11 @@ def registration(credentials, username, password, org):
     return
 
 
-def change_password(credentials, username, password, new_password):
+def change_password(credentials, username, password, new_password, client=None):
 
     try:
 
-        context = utils.platform(credentials, username, password)
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, username, password, client)
 
         with user:
             result = user.change_password(username, new_password)
@@ -81,12 +80,11 @@ def change_password(credentials, username, password, new_password):
         raise err
 
 
-def deregister(credentials, username, password):
+def deregister(credentials, username, password, client=None):
 
     try:
 
-        context = utils.platform(credentials, username, password)
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, username, password, client)
 
         with user:
             result = user.deregister()
@@ -101,13 +99,11 @@ def deregister(credentials, username, password):
         raise err
 
 
-def status(credentials, username, password):
+def status(credentials, username, password, client=None):
 
     try:
 
-        context = utils.platform(credentials, username, password)
-
-        user = ffl.Factory.user(context)
+        user = utils.platform_user(credentials, username, password, client)
 
         with user:
 
@@ -0,0 +1,184 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import logging
+import os
+import selectors
+import threading
+
+LOGGER = logging.getLogger('output pump')
+LOGGER.setLevel(logging.DEBUG)
+
+LOGS_PATH = 'results/logs/'
+READ_SIZE = 64 * 1024
+
+
+def stdout_log_path(user, kind, task_name):
+
+    """
+    File receiving the console output of a task process, next to its log
+    (results/logs/<user>_<kind>_<task_name>.log, which must end with the termination string).
+    :param user: user name
+    :param kind: 'aggregator' or 'participant'
+    :param task_name: name of the task
+    :rtype: `str`
+    """
+
+    return LOGS_PATH + str(user) + '_' + kind + '_' + task_name + '.stdout.log'
+
+
+class _Stream:
+
+    def __init__(self, pipe, sink, done):
+
+        self.pipe = pipe
+        self.sink = sink
+        self.done = done
+        self.bytes = 0
+
+
+class OutputPump:
+
+    """
+    A single thread draining the stdout of every child process into files. The pipes are
+    read as soon as data is available (selectors) and written straight to the file, so a
+    chatty child never blocks on a full pipe and no more than one read is held in memory.
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._selector = None
+        self._thread = None
+        self._wakeup = None
+        self._pending = []
+        self._streams = {}
+
+    def attach(self, pipe, path):
+
+        """
+        Drain a child pipe into a file (appended to).
+        Throws: An exception on failure
+        :param pipe: readable end of the child stdout (e.g. Popen.stdout)
+        :param path: output file
+        :type path: `str`
+        :return: event set once the pipe is closed and the output written
+        :rtype: :class:`threading.Event`
+        """
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        sink = open(path, 'ab')
+        os.set_blocking(pipe.fileno(), False)
+        stream = _Stream(pipe, sink, threading.Event())
+
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._pending.append(stream)
+        os.write(self._wakeup[1], b'\0')
+
+        return stream.done
+
+    def stats(self):
+
+        """
+        Bytes written so far per open output file
+        :rtype: `dict`
+        """
+
+        with self._lock:
+            return {stream.sink.name: stream.bytes for stream in self._streams.values()}
+
+    def _start(self):
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = os.pipe()
+        os.set_blocking(self._wakeup[0], False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._loop, name='output-pump', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+
+        while True:
+            for key, _ in self._selector.select():
+                if key.fd == self._wakeup[0]:
+                    self._register_pending()
+                else:
+                    self._pump(key.data)
+
+    def _register_pending(self):
+
+        try:
+            while os.read(self._wakeup[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            for stream in pending:
+                self._streams[stream.pipe.fileno()] = stream
+
+        for stream in pending:
+            self._selector.register(stream.pipe.fileno(), selectors.EVENT_READ, stream)
+
+    def _pump(self, stream):
+
+        try:
+            data = os.read(stream.pipe.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            LOGGER.warning('Reading the output for %s failed: %s', stream.sink.name, err)
+            data = b''
+
+        if not data:
+            self._close(stream)
+            return
+
+        stream.bytes += len(data)
+        try:
+            stream.sink.write(data)
+            stream.sink.flush()
+        except OSError as err:
+            # Keep draining: losing output is better than stalling the child
+            LOGGER.warning('Writing the output to %s failed: %s', stream.sink.name, err)
+
+    def _close(self, stream):
+
+        fd = stream.pipe.fileno()
+        self._selector.unregister(fd)
+        with self._lock:
+            self._streams.pop(fd, None)
+
+        for closable in (stream.pipe, stream.sink):
+            try:
+                closable.close()
+            except OSError:
+                pass
+        stream.done.set()
+
+
+OUTPUT_PUMP = OutputPump()
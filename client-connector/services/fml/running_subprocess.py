@@ -23,10 +23,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
 from abc import ABC, abstractmethod
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, STDOUT
 
 import sys
-import threading
+
+from services.fml.output_pump import OUTPUT_PUMP, stdout_log_path
+from services.fml.supervisor import SUPERVISOR
 
 
 class Client:
@@ -76,11 +78,16 @@ class AggregatorSubProcessV2(Client):
     def __init__(self, credentials, user, password, task_name, datasets, platform="cloud"):
         Client.__init__(self, credentials, user, password, task_name, datasets, platform)
 
+    def command(self):
+        return [sys.executable, 'master.py', "--credentials", self.credentials, "--user", self.user,
+                "--password", self.password, "--task_name", self.task_name, "--datasets", self.datasets,
+                "--platform", self.platform]
+
     def run(self):
         print("SubProcess Aggregator started")
-        Popen([sys.executable, 'master.py', "--credentials", self.credentials, "--user", self.user,
-               "--password", self.password, "--task_name", self.task_name, "--datasets", self.datasets,
-               "--platform", self.platform], bufsize=1, stdout=PIPE)
+        process = Popen(self.command(), stdout=PIPE, stderr=STDOUT)
+        SUPERVISOR.watch(process, "aggregator", self.user, self.task_name, reap=True)
+        OUTPUT_PUMP.attach(process.stdout, stdout_log_path(self.user, "aggregator", self.task_name))
 
 
 class ParticipantSubProcessV2(Client):
@@ -88,13 +95,16 @@ class ParticipantSubProcessV2(Client):
     def __init__(self, credentials, user, password, task_name, datasets, platform="cloud"):
         Client.__init__(self, credentials, user, password, task_name, datasets, platform)
 
-    def run(self):
-
-        # Create a Thread with a function
-        th = threading.Thread(target=run_participant, args=[self.credentials, self.user, self.password, self.task_name, self.datasets, self.platform])
+    def command(self):
+        return [sys.executable, 'worker.py', "--credentials", self.credentials, "--user", self.user,
+                "--password", self.password, "--task_name", self.task_name, "--datasets", self.datasets,
+                "--platform", self.platform]
 
-        # Start the thread
-        th.start()
+    def run(self):
+        print("SubProcess Participant started")
+        process = Popen(self.command(), stdout=PIPE, stderr=STDOUT)
+        SUPERVISOR.watch(process, "participant", self.user, self.task_name, reap=True)
+        OUTPUT_PUMP.attach(process.stdout, stdout_log_path(self.user, "participant", self.task_name))
 
 
 def run_participant(credentials, user, password, task_name, datasets, platform):
@@ -102,8 +112,9 @@ def run_participant(credentials, user, password, task_name, datasets, platform):
     print("SubProcess Participant started")
     process = Popen([sys.executable, 'worker.py', "--credentials", credentials, "--user", user,
                      "--password", password, "--task_name", task_name, "--datasets", datasets,
-                     "--platform", platform], bufsize=1, stdout=PIPE)
+                     "--platform", platform], stdout=PIPE, stderr=STDOUT)
+    record = SUPERVISOR.watch(process, "participant", user, task_name)
+    drained = OUTPUT_PUMP.attach(process.stdout, stdout_log_path(user, "participant", task_name))
 
-    for line in iter(process.stdout.readline, b''):
-        print(line)
-    process.communicate()
+    SUPERVISOR.wait(record)
+    drained.wait()
@@ -0,0 +1,361 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import collections
+import configparser
+import logging
+import os
+import threading
+import time
+import uuid
+
+from services.fml.output_pump import OUTPUT_PUMP, stdout_log_path
+from services.fml.supervisor import SUPERVISOR
+from services.fml.warm_pool import WARM_POOL
+
+LOGGER = logging.getLogger('scheduler')
+LOGGER.setLevel(logging.DEBUG)
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+MAX_JOBS = config.getint("SCHEDULER", "MAX_JOBS", fallback=0)  # jobs starting at the same time, 0: one per CPU
+MIN_FREE_MEMORY_MB = config.getint("SCHEDULER", "MIN_FREE_MEMORY_MB", fallback=1024)
+MAX_LOAD = config.getfloat("SCHEDULER", "MAX_LOAD", fallback=1.0)  # 1-minute load average per CPU
+HISTORY = config.getint("SCHEDULER", "HISTORY", fallback=200)
+
+QUEUED = "QUEUED"
+STARTING = "STARTING"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+FINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Seconds between two checks of the host resources while launches are held back
+POLL_INTERVAL = 1.0
+
+# Seconds to wait, after the exit of a process, for its remaining output to be written
+OUTPUT_DRAIN_TIMEOUT = 10.0
+
+
+def available_memory_mb():
+
+    """
+    Memory available for new processes, None where /proc/meminfo is missing.
+    :rtype: `float`
+    """
+
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def load_per_cpu():
+
+    """
+    1-minute load average divided by the number of CPUs, None where not available.
+    :rtype: `float`
+    """
+
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class Job:
+
+    """
+    A launch of master.py or worker.py requested through the REST API.
+    """
+
+    def __init__(self, client, kind, prepare=None):
+
+        """
+        :param client: subprocess client of the task (see running_subprocess)
+        :type client: :class:`running_subprocess.Client`
+        :param kind: 'aggregator' or 'participant'
+        :type kind: `str`
+        :param prepare: optional function run before the launch (e.g. joining the task), it can return
+                        labels describing the task (e.g. algorithm and POM) for the process record
+        """
+
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.kind = kind
+        self.prepare = prepare
+
+        self.state = QUEUED
+        self.cancelled = False
+        self.error = None
+        self.pid = None
+        self.returncode = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+        self.labels = {}
+        self.process = None
+
+    @property
+    def user(self):
+        return self.client.user
+
+    @property
+    def task_name(self):
+        return self.client.task_name
+
+    def to_dict(self):
+
+        return {"job_id": self.id, "kind": self.kind, "user": self.user, "task_name": self.task_name,
+                "labels": self.labels, "state": self.state, "error": self.error, "pid": self.pid, "returncode": self.returncode,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+
+
+class JobScheduler:
+
+    """
+    Queue of task launches. Jobs are started in submission order as long as the number of
+    jobs still starting, the free memory and the load of the host allow it, so that a burst of
+    launches does not overload the machine nor keep the HTTP threads busy. A job leaves its slot
+    once its process is started: a training lasting hours never holds back the launches of other
+    tasks (e.g. the participant a remote aggregator is waiting for), and when no job is active
+    at all the next one is always started.
+    """
+
+    def __init__(self, max_jobs=MAX_JOBS, min_free_memory_mb=MIN_FREE_MEMORY_MB, max_load=MAX_LOAD,
+                 history=HISTORY):
+
+        """
+        :param max_jobs: maximum number of jobs starting at the same time (0: one per CPU)
+        :type max_jobs: `int`
+        :param min_free_memory_mb: memory that must be available to start a job
+        :type min_free_memory_mb: `int`
+        :param max_load: 1-minute load average per CPU above which launches are held back
+        :type max_load: `float`
+        :param history: finished jobs kept for the status endpoints
+        :type history: `int`
+        """
+
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_load = max_load
+        self.history = history
+
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._jobs = collections.OrderedDict()
+        self._starting = 0  # jobs holding a slot, until their process is started
+        self._active = 0  # jobs starting or running
+        self._dispatcher = None
+
+    def submit(self, client, kind, prepare=None):
+
+        """
+        Queue a launch and return immediately.
+        :param client: subprocess client of the task (see running_subprocess)
+        :param kind: 'aggregator' or 'participant'
+        :type kind: `str`
+        :param prepare: optional function run before the launch
+        :return: the queued job
+        :rtype: :class:`Job`
+        """
+
+        job = Job(client, kind, prepare)
+
+        with self._condition:
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._forget_finished()
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+                self._dispatcher.start()
+            self._condition.notify_all()
+
+        LOGGER.info('Job %s queued: %s of %s for %s', job.id, kind, job.task_name, job.user)
+        return job
+
+    def get(self, job_id):
+
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self, user=None):
+
+        """
+        Jobs known to the scheduler, the most recent first.
+        :param user: only the jobs of this user, if given
+        :type user: `str`
+        :rtype: `list`
+        """
+
+        with self._condition:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if user is None or job.user == user]
+
+    def cancel(self, job_id):
+
+        """
+        Remove a queued job, or terminate a running one.
+        :param job_id: job id
+        :type job_id: `str`
+        :return: the job, None if unknown
+        :rtype: :class:`Job`
+        """
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            if job.state == QUEUED:
+                self._queue.remove(job)
+                job.state = CANCELLED
+                job.finished = time.time()
+                return job
+
+            job.cancelled = True
+            process = job.process
+            running = job.state == RUNNING
+
+        # A job still STARTING is stopped by _run as soon as its process exists
+        if process is not None and running:
+            LOGGER.info('Job %s: terminating process %d', job.id, process.pid)
+            process.terminate()
+        return job
+
+    def stats(self):
+
+        with self._condition:
+            return {"max_jobs": self.max_jobs, "starting": self._starting, "active": self._active, "queued": len(self._queue),
+                    "available_memory_mb": available_memory_mb(), "load_per_cpu": load_per_cpu()}
+
+    def _forget_finished(self):
+
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _has_capacity(self):
+
+        if self._starting >= self.max_jobs:
+            return False
+
+        # Nothing started would ever free memory or load: with no active job, the next one starts
+        if not self._active:
+            return True
+
+        memory = available_memory_mb()
+        if memory is not None and memory < self.min_free_memory_mb:
+            LOGGER.debug('Launch held back: %.0f MB available', memory)
+            return False
+
+        load = load_per_cpu()
+        if load is not None and load > self.max_load:
+            LOGGER.debug('Launch held back: load %.2f per CPU', load)
+            return False
+
+        return True
+
+    def _dispatch(self):
+
+        while True:
+            with self._condition:
+                while not self._queue or not self._has_capacity():
+                    self._condition.wait(POLL_INTERVAL if self._queue else None)
+                job = self._queue.popleft()
+                job.state = STARTING
+                self._starting += 1
+                self._active += 1
+
+            threading.Thread(target=self._run, args=[job], name='job-' + job.id, daemon=True).start()
+
+    def _started(self, job):
+
+        # Called with the condition held
+        if job.state == STARTING:
+            self._starting -= 1
+            self._condition.notify_all()
+
+    def _run(self, job):
+
+        try:
+            if job.prepare is not None:
+                job.labels = job.prepare() or {}
+
+            with self._condition:
+                if job.cancelled:
+                    self._started(job)
+                    job.state = CANCELLED
+                    return
+
+            process = WARM_POOL.popen(job.client.command())
+            record = SUPERVISOR.watch(process, job.kind, job.user, job.task_name, job.id, job.labels)
+            with self._condition:
+                job.process = process
+                job.pid = process.pid
+                job.started = time.time()
+                self._started(job)
+                job.state = RUNNING
+                cancelled = job.cancelled
+            LOGGER.info('Job %s started: process %d', job.id, process.pid)
+
+            if cancelled:
+                # Cancelled while starting: the process is still reaped and accounted below
+                LOGGER.info('Job %s: terminating process %d', job.id, process.pid)
+                process.terminate()
+
+            drained = OUTPUT_PUMP.attach(process.stdout, stdout_log_path(job.user, job.kind, job.task_name))
+            returncode = SUPERVISOR.wait(record)
+            drained.wait(OUTPUT_DRAIN_TIMEOUT)
+
+            with self._condition:
+                job.returncode = returncode
+                if job.cancelled:
+                    job.state = CANCELLED
+                else:
+                    job.state = COMPLETED if returncode == 0 else FAILED
+
+        except Exception as err:
+            LOGGER.error('Job %s failed: %s', job.id, err)
+            with self._condition:
+                self._started(job)
+                job.error = str(err)
+                job.state = FAILED
+
+        finally:
+            with self._condition:
+                job.finished = time.time()
+                job.process = None
+                self._active -= 1
+                self._condition.notify_all()
+
+            LOGGER.info('Job %s %s', job.id, job.state.lower())
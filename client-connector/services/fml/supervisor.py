@@ -0,0 +1,376 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import collections
+import configparser
+import datetime
+import logging
+import os
+import threading
+import time
+
+LOGGER = logging.getLogger('supervisor')
+LOGGER.setLevel(logging.DEBUG)
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+SAMPLE_INTERVAL = config.getfloat("SUPERVISOR", "SAMPLE_INTERVAL", fallback=5.0)
+PERSIST_EVERY = config.getint("SUPERVISOR", "PERSIST_EVERY", fallback=12)  # samples between two saves
+MAX_SAMPLES = config.getint("SUPERVISOR", "MAX_SAMPLES", fallback=720)
+HISTORY = config.getint("SUPERVISOR", "HISTORY", fallback=200)
+
+RUNNING = "RUNNING"
+EXITED = "EXITED"
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+
+
+def read_proc(pid):
+
+    """
+    CPU times, resident memory and threads of a live process from /proc.
+    :param pid: process id
+    :type pid: `int`
+    :return: cpu_user, cpu_system (seconds), rss_mb, peak_rss_mb, threads; None if not available
+    :rtype: `dict`
+    """
+
+    try:
+        with open('/proc/%d/stat' % pid) as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open('/proc/%d/status' % pid) as status_file:
+            status = dict(line.split(':', 1) for line in status_file if ':' in line)
+    except (OSError, IndexError, ValueError):
+        return None
+
+    def kb_to_mb(name):
+        return int(status[name].split()[0]) / 1024.0 if name in status else None
+
+    return {"cpu_user": int(fields[11]) / CLOCK_TICKS, "cpu_system": int(fields[12]) / CLOCK_TICKS,
+            "rss_mb": kb_to_mb('VmRSS'), "peak_rss_mb": kb_to_mb('VmHWM'), "threads": int(fields[17])}
+
+
+class ProcessRecord:
+
+    """
+    Resource usage of a master.py or worker.py process.
+    """
+
+    def __init__(self, process, kind, user, task_name, job_id=None, labels=None, reap=False):
+
+        # Usage of a warm interpreter when the task was handed to it (see warm_pool), not counted
+        baseline = getattr(process, 'baseline', None) or {}
+        self.preload_cpu = baseline.get("cpu_user", 0.0) + baseline.get("cpu_system", 0.0)
+        self.preload_rss_mb = baseline.get("rss_mb") or 0.0
+        self._baseline_user = baseline.get("cpu_user", 0.0)
+        self._baseline_system = baseline.get("cpu_system", 0.0)
+
+        self.process = process
+        self.pid = process.pid
+        self.kind = kind
+        self.user = user
+        self.task_name = task_name
+        self.job_id = job_id
+        self.labels = dict(labels or {})
+
+        self.state = RUNNING
+        self.returncode = None
+        self.started = time.time()
+        self.finished = None
+        self.cpu_user = 0.0
+        self.cpu_system = 0.0
+        self.rss_mb = None
+        self.peak_rss_mb = None
+        self.threads = None
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)
+
+        self.reap = reap  # reaped by the sampler, nobody waits for it
+        self.sampled = 0
+
+    @property
+    def wall_seconds(self):
+        return (self.finished or time.time()) - self.started
+
+    def update(self, usage):
+
+        self.set_cpu(usage["cpu_user"], usage["cpu_system"])
+        self.threads = usage["threads"]
+        if usage["rss_mb"] is not None:
+            self.rss_mb = self.task_memory(usage["rss_mb"])
+        peak = usage["peak_rss_mb"] if usage["peak_rss_mb"] is not None else usage["rss_mb"]
+        if peak is not None:
+            self.set_peak(peak)
+        self.samples.append((round(time.time() - self.started, 3), round(self.cpu_user + self.cpu_system, 3),
+                             self.rss_mb))
+        self.sampled += 1
+
+    def set_cpu(self, cpu_user, cpu_system):
+
+        self.cpu_user = max(cpu_user - self._baseline_user, 0.0)
+        self.cpu_system = max(cpu_system - self._baseline_system, 0.0)
+
+    def set_peak(self, peak_rss_mb):
+
+        self.peak_rss_mb = max(self.peak_rss_mb or 0.0, self.task_memory(peak_rss_mb))
+
+    def task_memory(self, rss_mb):
+
+        # Memory of the task, beyond what the warm interpreter held when it was handed over
+        return max(rss_mb - self.preload_rss_mb, 0.0)
+
+    def to_dict(self, samples=False):
+
+        record = {"pid": self.pid, "kind": self.kind, "user": self.user, "task_name": self.task_name,
+                  "job_id": self.job_id, "labels": self.labels, "state": self.state,
+                  "returncode": self.returncode, "started": self.started, "finished": self.finished,
+                  "wall_seconds": self.wall_seconds, "cpu_user_seconds": self.cpu_user,
+                  "cpu_system_seconds": self.cpu_system, "rss_mb": self.rss_mb, "peak_rss_mb": self.peak_rss_mb,
+                  "threads": self.threads, "preload_cpu_seconds": self.preload_cpu,
+                  "preload_rss_mb": self.preload_rss_mb}
+        if samples:
+            record["samples"] = list(self.samples)
+        return record
+
+
+class Supervisor:
+
+    """
+    Registry of the processes launched by the Client Connector. A sampler thread reads their
+    CPU time and memory from /proc; the exit status and the final resource usage are taken
+    from the kernel when the process is reaped (os.wait4). Records are saved per task in MongoDB
+    by a thread of their own, so that a slow database never delays sampling nor reaping.
+    For a task started on a warm interpreter, the CPU time and memory the interpreter had used
+    preloading the libraries are reported apart ('preload_*') and left out of the totals.
+    """
+
+    def __init__(self, sample_interval=SAMPLE_INTERVAL, persist_every=PERSIST_EVERY, history=HISTORY,
+                 persist=True):
+
+        """
+        :param sample_interval: seconds between two samples
+        :type sample_interval: `float`
+        :param persist_every: samples between two saves of a running process
+        :type persist_every: `int`
+        :param history: exited processes kept in memory
+        :type history: `int`
+        :param persist: whether to save the records in MongoDB
+        :type persist: `bool`
+        """
+
+        self.sample_interval = sample_interval
+        self.persist_every = persist_every
+        self.history = history
+        self.persist = persist
+
+        self._lock = threading.Lock()
+        self._records = collections.OrderedDict()  # pid -> ProcessRecord
+        self._sampler = None
+        self._unsaved = threading.Condition(self._lock)
+        self._pending = collections.OrderedDict()  # (pid, started) -> latest fields to be saved
+        self._persister = None
+
+    def watch(self, process, kind, user, task_name, job_id=None, labels=None, reap=False):
+
+        """
+        Register a process started with subprocess.Popen.
+        :param process: the process
+        :type process: :class:`subprocess.Popen`
+        :param kind: 'aggregator' or 'participant'
+        :param user: user who launched it
+        :param task_name: name of the task
+        :param job_id: id of the scheduler job, if any
+        :param labels: details of the task (e.g. algorithm and POM)
+        :type labels: `dict`
+        :param reap: True if nobody will call :meth:`wait`, the sampler then reaps the process
+        :type reap: `bool`
+        :return: the record of the process
+        :rtype: :class:`ProcessRecord`
+        """
+
+        record = ProcessRecord(process, kind, user, task_name, job_id, labels, reap)
+
+        with self._lock:
+            self._records[record.pid] = record
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='process-sampler', daemon=True)
+                self._sampler.start()
+
+        LOGGER.info('Supervising %s process %d of %s', kind, record.pid, task_name)
+        self._sample(record)
+        self._save(record)
+        return record
+
+    def wait(self, record):
+
+        """
+        Wait for a supervised process to exit and account its resource usage.
+        :param record: record returned by :meth:`watch`
+        :type record: :class:`ProcessRecord`
+        :return: exit code (negative signal number if killed)
+        :rtype: `int`
+        """
+
+        if record.state == RUNNING:
+            self._reap(record, 0)
+        return record.returncode
+
+    def records(self, user=None, task_name=None):
+
+        """
+        Supervised processes, the most recent first.
+        :rtype: `list`
+        """
+
+        with self._lock:
+            records = list(self._records.values())
+        return [record for record in reversed(records)
+                if (user is None or record.user == user) and (task_name is None or record.task_name == task_name)]
+
+    def history_of(self, task_name, user=None):
+
+        """
+        Records saved in MongoDB for a task, the most recent first.
+        :rtype: `list`
+        """
+
+        from services.cc.models import TaskProcess
+        query = TaskProcess.objects(task_name=task_name)
+        if user is not None:
+            query = query.filter(user=user)
+
+        history = []
+        for stored in query.order_by('-started'):
+            record = stored.to_mongo().to_dict()
+            record.pop('_id', None)
+            for key in ('started', 'finished'):
+                if isinstance(record.get(key), datetime.datetime):
+                    record[key] = record[key].isoformat()
+            history.append(record)
+        return history
+
+    def _reap(self, record, options):
+
+        try:
+            pid, status, rusage = os.wait4(record.pid, options)
+        except ChildProcessError:
+            # Reaped elsewhere (e.g. by Popen.wait): only the exit code is known
+            pid, status, rusage = record.pid, None, None
+        if pid == 0:
+            return False
+
+        if status is None:
+            returncode = record.process.returncode
+        elif os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+
+        # Let the Popen object know, it can no longer wait for the process
+        record.process.returncode = returncode
+
+        with self._lock:
+            record.returncode = returncode
+            record.finished = time.time()
+            record.state = EXITED
+            if rusage is not None:
+                record.set_cpu(rusage.ru_utime, rusage.ru_stime)
+                record.set_peak(rusage.ru_maxrss / 1024.0)  # KB on Linux
+            self._forget_exited()
+
+        LOGGER.info('%s process %d of %s exited with %s: %.1fs wall, %.1fs CPU, %.1f MB peak RSS',
+                    record.kind, record.pid, record.task_name, returncode, record.wall_seconds,
+                    record.cpu_user + record.cpu_system, record.peak_rss_mb or 0.0)
+        self._save(record)
+        return True
+
+    def _forget_exited(self):
+
+        exited = [pid for pid, record in self._records.items() if record.state == EXITED]
+        for pid in exited[:max(0, len(exited) - self.history)]:
+            del self._records[pid]
+
+    def _sample(self, record):
+
+        usage = read_proc(record.pid)
+        if usage is not None:
+            with self._lock:
+                if record.state == RUNNING:
+                    record.update(usage)
+
+    def _sample_loop(self):
+
+        while True:
+            time.sleep(self.sample_interval)
+
+            with self._lock:
+                running = [record for record in self._records.values() if record.state == RUNNING]
+
+            for record in running:
+                self._sample(record)
+                if record.reap and self._reap(record, os.WNOHANG):
+                    continue
+                if self.persist_every and record.sampled % self.persist_every == 0:
+                    self._save(record)
+
+    def _save(self, record):
+
+        if not self.persist:
+            return
+
+        # Only the latest state of a record waiting to be saved is written
+        with self._lock:
+            self._pending[(record.pid, record.started)] = record.to_dict(samples=True)
+            if self._persister is None:
+                self._persister = threading.Thread(target=self._persist_loop, name='process-persister', daemon=True)
+                self._persister.start()
+            self._unsaved.notify()
+
+    def _persist_loop(self):
+
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._unsaved.wait()
+                _, fields = self._pending.popitem(last=False)
+            self._write(fields)
+
+    @staticmethod
+    def _write(fields):
+
+        try:
+            from services.cc.models import TaskProcess
+            fields["started"] = datetime.datetime.utcfromtimestamp(fields["started"])
+            if fields["finished"] is not None:
+                fields["finished"] = datetime.datetime.utcfromtimestamp(fields["finished"])
+            TaskProcess.objects(pid=record.pid, started=fields["started"]).update_one(upsert=True, **{
+                "set__" + key: value for key, value in fields.items() if key not in ("pid", "started")})
+        except Exception as err:
+            LOGGER.warning('Could not save the record of process %d: %s', fields["pid"], err)
+
+
+SUPERVISOR = Supervisor()
@@ -0,0 +1,225 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from subprocess import Popen, PIPE, STDOUT
+
+import atexit
+import configparser
+import json
+import logging
+import os
+import sys
+import threading
+
+from services.fml.supervisor import read_proc
+
+LOGGER = logging.getLogger('warm pool')
+LOGGER.setLevel(logging.DEBUG)
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+WARM_POOL_SIZE = config.getint("WARM_POOL", "SIZE", fallback=1)
+
+WARM_WORKER = 'warm_worker.py'
+WARM_SCRIPTS = ('master.py', 'worker.py')
+
+
+class WarmPool:
+
+    """
+    Interpreters started ahead of time with the Federated Machine Learning libraries already
+    imported (warm_worker.py). A launch of master.py or worker.py is handed to an idle one
+    over its stdin, and a replacement is started in the background; when none is ready the
+    script is started cold, as before. The interpreters are started on the first launch, so
+    that importing the controller (or a process that never launches a task) does not pay them.
+    """
+
+    def __init__(self, size=WARM_POOL_SIZE):
+
+        """
+        :param size: idle interpreters kept ready (0 disables the pool)
+        :type size: `int`
+        """
+
+        self.size = size
+
+        self._lock = threading.Lock()
+        self._idle = []
+        self._starting = 0
+        self._stats = {"warm": 0, "cold": 0}
+        self._started = False
+        self._closed = True
+
+    def start(self):
+
+        """
+        Start the idle interpreters
+        """
+
+        with self._lock:
+            if self._started or self.size <= 0:
+                return
+            self._started = True
+            self._closed = False
+
+        atexit.register(self.close)
+        self._fill()
+
+    def popen(self, command):
+
+        """
+        Start a command like Popen(command, stdout=PIPE, stderr=STDOUT), on a warm interpreter
+        when the command runs master.py or worker.py and one is ready.
+        Throws: An exception on failure
+        :param command: [sys.executable, script, arguments...]
+        :type command: `list`
+        :rtype: :class:`subprocess.Popen`
+        """
+
+        process = None
+        if len(command) > 1 and command[0] == sys.executable and os.path.basename(command[1]) in WARM_SCRIPTS:
+            if not self._started:
+                self.start()
+            process = self._acquire()
+
+        if process is None:
+            with self._lock:
+                self._stats["cold"] += 1
+            return Popen(command, stdout=PIPE, stderr=STDOUT)
+
+        try:
+            # Usage of the preload, left out of the accounting of the task (see supervisor)
+            process.baseline = read_proc(process.pid)
+            process.stdin.write((json.dumps({"argv": command[1:]}) + '\n').encode('utf-8'))
+            process.stdin.close()
+        except OSError as err:
+            LOGGER.warning('Warm interpreter %d unusable (%s), starting cold', process.pid, err)
+            process.kill()
+            process.wait()
+            with self._lock:
+                self._stats["cold"] += 1
+            return Popen(command, stdout=PIPE, stderr=STDOUT)
+
+        with self._lock:
+            self._stats["warm"] += 1
+        LOGGER.info('%s handed to warm interpreter %d', command[1], process.pid)
+        return process
+
+    def stats(self):
+
+        with self._lock:
+            return dict(self._stats, size=self.size, idle=len(self._idle), starting=self._starting)
+
+    def recycle(self):
+
+        """
+        Replace the idle interpreters, e.g. after the installed libraries have changed
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+            idle, self._idle = self._idle, []
+
+        self._release(idle)
+        self._fill()
+
+    def close(self):
+
+        """
+        Stop the idle interpreters
+        """
+
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        self._release(idle)
+
+    @staticmethod
+    def _release(idle):
+
+        for process in idle:
+            process.stdin.close()  # the interpreter exits without a launch request
+            try:
+                process.wait(timeout=5)
+            except Exception:
+                process.kill()
+                process.wait()
+
+    def _acquire(self):
+
+        with self._lock:
+            if self._closed:
+                return None
+            while self._idle:
+                process = self._idle.pop(0)
+                if process.poll() is None:
+                    break
+                LOGGER.warning('Warm interpreter %d exited with %s while idle', process.pid, process.returncode)
+            else:
+                process = None
+
+        self._fill()
+        return process
+
+    def _fill(self):
+
+        with self._lock:
+            missing = 0 if self._closed else self.size - len(self._idle) - self._starting
+            self._starting += max(missing, 0)
+
+        for _ in range(missing):
+            threading.Thread(target=self._start_one, name='warm-pool-start', daemon=True).start()
+
+    def _start_one(self):
+
+        process = None
+        try:
+            process = Popen([sys.executable, WARM_WORKER], stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+            line = process.stdout.readline()
+            # Preload warnings are logged on stderr, merged in stdout: skip to the readiness line
+            while line and not line.startswith(b'ready'):
+                LOGGER.debug('[warm %d] %s', process.pid, line.rstrip().decode('utf-8', 'replace'))
+                line = process.stdout.readline()
+            if not line:
+                raise RuntimeError('exited with %s before being ready' % process.wait())
+            LOGGER.info('Warm interpreter %d ready (preload %ss)', process.pid, line.split()[1].decode('ascii'))
+        except Exception as err:
+            LOGGER.error('Warm interpreter could not be started: %s', err)
+            process = None
+        finally:
+            with self._lock:
+                self._starting -= 1
+                if process is not None and not self._closed:
+                    self._idle.append(process)
+                    process = None
+
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+
+
+WARM_POOL = WarmPool()
@@ -22,12 +22,52 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
+import threading
+
+import communication_abstract_interface as ffl
+from utils import platform_utils
+
+
 class User:
 
-    def __init__(self, id, username, password):
+    def __init__(self, id, username, password, credentials=None):
         self.id = id
         self.username = username
         self.password = password
+        self.credentials = credentials
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._context = None
 
     def __repr__(self):
         return f'<User: {self.username}>'
+
+    @property
+    def client(self):
+        """
+        Platform user client of the logged session, holding its context, messenger and connection pool.
+        Created on first use and shared by the requests of the session.
+        Throws: An exception on failure
+        """
+        with self._lock:
+            if self._client is None:
+                context = platform_utils.acquire(self.credentials, self.username, self.password)
+                try:
+                    self._client = ffl.Factory.user(context)
+                except Exception:
+                    platform_utils.release(context)
+                    raise
+                self._context = context
+            return self._client
+
+    def close(self):
+        """
+        Release the platform client of the session (at logout). Its context may be shared with
+        other sessions of the same user: it is closed by platform_utils once nobody holds it.
+        """
+        with self._lock:
+            context, self._context, self._client = self._context, None, None
+
+        if context is not None:
+            platform_utils.release(context)
@@ -21,22 +21,18 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from PIL import Image
 from io import BytesIO
-from sklearn.decomposition import PCA
-from sklearn.metrics import confusion_matrix
 from utils.compare_models import CompareModels
 
 import json
 import traceback
-import matplotlib.pyplot as plt
-import numpy as np
 import os
-import pandas as pd
-import seaborn as sn
 import logging
 import configparser
 
+# matplotlib, seaborn, pandas, scikit-learn and PIL are imported where they are used:
+# the controller imports this module but only needs get_chart, on PNG files
+
 # Set up logger
 logging.basicConfig(
     level=logging.ERROR,
@@ -51,9 +47,13 @@ config.read('app.ini')
 
 SERVER_DB_PATH = config["SERVER"]["SERVER_DB_PATH"]
 
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
 
 def create_chart(user, master_node, pom, algorithm_name, type, task_name, model, x, y_tst):
 
+    import numpy as np
+
     if algorithm_name == "LC_pm":
 
         x_b = master_node.add_bias(x)
@@ -97,6 +97,9 @@ def create_chart(user, master_node, pom, algorithm_name, type, task_name, model,
 
 def clustering_pca(user, x, preds, task_name):
 
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+
     if len(x[0]) == 2:
 
         try:
@@ -130,7 +133,16 @@ def clustering_pca(user, x, preds, task_name):
             traceback.print_exc()
 
 
-def plot_cm_seaborn(user, preds, y, classes, task_name, normalize=False, cmap=plt.cm.GnBu):
+def plot_cm_seaborn(user, preds, y, classes, task_name, normalize=False, cmap=None):
+
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+    import seaborn as sn
+    from sklearn.metrics import confusion_matrix
+
+    if cmap is None:
+        cmap = plt.cm.GnBu
 
     cnf_matrix = confusion_matrix(y, preds)
 
@@ -175,7 +187,15 @@ def add_image_result(task_name, relative_path):
 
 def get_chart(url):
 
-    im = Image.open(url)
+    # PNG files are served as they are, without decoding them
+    with open(url, 'rb') as image_file:
+        data = image_file.read()
+    if data.startswith(PNG_SIGNATURE):
+        return data
+
+    from PIL import Image
+
+    im = Image.open(BytesIO(data))
     io = BytesIO()
     im.save(io, format='PNG')
 
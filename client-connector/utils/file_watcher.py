@@ -0,0 +1,316 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import configparser
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+LOGGER = logging.getLogger('file watcher')
+LOGGER.setLevel(logging.DEBUG)
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+BACKEND = config.get("LOG_STREAM", "WATCHER", fallback="auto")
+POLL_INTERVAL = config.getfloat("LOG_STREAM", "POLL_INTERVAL", fallback=0.5)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+             IN_DELETE_SELF | IN_MOVE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+class PollingWatch:
+
+    """
+    Change notifications of a file obtained by comparing its status every POLL_INTERVAL seconds
+    """
+
+    def __init__(self, path, interval=None):
+
+        self.path = path
+        self.interval = POLL_INTERVAL if interval is None else interval
+        self._status = self._stat()
+
+    def _stat(self):
+
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return None
+        return status.st_dev, status.st_ino, status.st_size, status.st_mtime_ns
+
+    def wait(self, timeout=None):
+
+        """
+        Wait for the file to change (written, replaced, truncated or removed).
+        :param timeout: maximum seconds to wait, None for no limit
+        :type timeout: `float`
+        :return: True if the file changed, False on timeout
+        :rtype: `bool`
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self._stat()
+            if status != self._status:
+                self._status = status
+                return True
+            remaining = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            time.sleep(remaining)
+
+    def close(self):
+
+        pass
+
+
+class InotifyWatch:
+
+    """
+    Change notifications of a file delivered by the kernel, through the :class:`InotifyWatcher`
+    watching its directory (so that replacing the file is noticed as well)
+    """
+
+    def __init__(self, watcher, path):
+
+        self.path = path
+        self.directory, self.name = os.path.split(os.path.abspath(path))
+        self._watcher = watcher
+        self._changed = threading.Event()
+        self._fallback = None
+
+    def notify(self):
+
+        self._changed.set()
+
+    def lost(self):
+
+        # The directory is no longer watched (removed or moved): go on polling the file
+        self._fallback = PollingWatch(self.path)
+        self._changed.set()
+
+    def wait(self, timeout=None):
+
+        """
+        Wait for the file to change (written, replaced, truncated or removed).
+        :param timeout: maximum seconds to wait, None for no limit
+        :type timeout: `float`
+        :return: True if the file changed, False on timeout
+        :rtype: `bool`
+        """
+
+        if self._fallback is not None:
+            return self._fallback.wait(timeout)
+
+        changed = self._changed.wait(timeout)
+        # Cleared before the caller reads the file: a change from now on wakes the next wait
+        self._changed.clear()
+        return changed
+
+    def close(self):
+
+        self._watcher.remove(self)
+
+
+class InotifyWatcher:
+
+    """
+    A single inotify instance and thread serving every :class:`InotifyWatch` of the process.
+    Directories are watched once, whatever the number of files followed in them.
+    """
+
+    def __init__(self):
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+        self._lock = threading.Lock()
+        self._directories = {}  # directory -> watch descriptor
+        self._descriptors = {}  # watch descriptor -> directory
+        self._watches = {}      # directory -> name -> set of InotifyWatch
+
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+
+    def watch(self, path):
+
+        """
+        Start watching a file.
+        Throws: An exception if its directory cannot be watched
+        :param path: path of the file, which may not exist yet
+        :type path: `str`
+        :rtype: :class:`InotifyWatch`
+        """
+
+        watch = InotifyWatch(self, path)
+        with self._lock:
+            if watch.directory not in self._directories:
+                descriptor = self._add_watch(self._fd, os.fsencode(watch.directory), WATCH_MASK)
+                if descriptor < 0:
+                    error = ctypes.get_errno()
+                    raise OSError(error, os.strerror(error), watch.directory)
+                self._directories[watch.directory] = descriptor
+                self._descriptors[descriptor] = watch.directory
+            self._watches.setdefault(watch.directory, {}).setdefault(watch.name, set()).add(watch)
+        return watch
+
+    def remove(self, watch):
+
+        with self._lock:
+            names = self._watches.get(watch.directory, {})
+            names.get(watch.name, set()).discard(watch)
+            if names.get(watch.name) == set():
+                del names[watch.name]
+            if names or watch.directory not in self._directories:
+                return
+            del self._watches[watch.directory]
+            descriptor = self._directories.pop(watch.directory)
+            del self._descriptors[descriptor]
+            self._rm_watch(self._fd, descriptor)
+
+    def _run(self):
+
+        while True:
+            try:
+                select.select([self._fd], [], [])
+                data = os.read(self._fd, READ_SIZE)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                LOGGER.error('inotify read failed: %s', err)
+                self._lose_all()
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data):
+
+        notified = set()
+        offset = 0
+        with self._lock:
+            while offset < len(data):
+                descriptor, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+                offset += EVENT_HEADER.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: wake everybody up, the readers find out what changed
+                    for names in self._watches.values():
+                        for watches in names.values():
+                            notified.update(watches)
+                    continue
+
+                directory = self._descriptors.get(descriptor)
+                if directory is None:
+                    continue
+
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    del self._descriptors[descriptor]
+                    del self._directories[directory]
+                    if not mask & IN_IGNORED:
+                        self._rm_watch(self._fd, descriptor)
+                    for watches in self._watches.pop(directory, {}).values():
+                        for watch in watches:
+                            watch.lost()
+                    continue
+
+                notified.update(self._watches.get(directory, {}).get(name, ()))
+
+        for watch in notified:
+            watch.notify()
+
+    def _lose_all(self):
+
+        with self._lock:
+            watches = [watch for names in self._watches.values() for group in names.values() for watch in group]
+            self._watches.clear()
+            self._directories.clear()
+            self._descriptors.clear()
+        for watch in watches:
+            watch.lost()
+
+
+_lock = threading.Lock()
+_watcher = None
+_unavailable = False
+
+
+def watch(path):
+
+    """
+    Watch a file for changes: with inotify on Linux, by polling its status elsewhere
+    (or when inotify is not available, or [LOG_STREAM] WATCHER is 'poll').
+    :param path: path of the file, which may not exist yet
+    :type path: `str`
+    :return: an object whose wait(timeout) returns when the file changes, to be closed after use
+    :rtype: :class:`InotifyWatch` or :class:`PollingWatch`
+    """
+
+    global _watcher, _unavailable
+
+    if BACKEND != 'poll':
+        with _lock:
+            if _watcher is None and not _unavailable:
+                try:
+                    _watcher = InotifyWatcher()
+                except (OSError, AttributeError) as err:
+                    LOGGER.info('inotify not available (%s), log files are polled', err)
+                    _unavailable = True
+        if _watcher is not None:
+            try:
+                return _watcher.watch(path)
+            except OSError as err:
+                LOGGER.debug('Cannot watch %s with inotify (%s), polling it', path, err)
+
+    return PollingWatch(path)
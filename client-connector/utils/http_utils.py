@@ -0,0 +1,109 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import configparser
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+COMPRESSION_THRESHOLD = config.getint("HTTP", "COMPRESSION_THRESHOLD", fallback=1024)
+GZIP_LEVEL = config.getint("HTTP", "GZIP_LEVEL", fallback=6)
+BROTLI_QUALITY = config.getint("HTTP", "BROTLI_QUALITY", fallback=5)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'application/xml')
+
+
+def _compressible(response):
+
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') and mimetype != 'text/event-stream' or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _choose_encoding(accept_encodings):
+
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def conditional_compressed(request, response):
+
+    """
+    Add a strong ETag to a complete 200 response to a GET request and answer 304 Not Modified
+    when it matches If-None-Match; compress text bodies above the size threshold with brotli
+    (when installed) or gzip, as accepted by the client. Streamed responses (e.g. server-sent
+    events) and responses already encoded are returned unchanged.
+    :param request: current request
+    :type request: :class:`flask.Request`
+    :param response: response of the view
+    :type response: :class:`flask.Response`
+    :return: the response to be sent
+    :rtype: :class:`flask.Response`
+    """
+
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers or request.method not in ('GET', 'HEAD'):
+        return response
+
+    data = response.get_data()
+
+    encoding = None
+    if len(data) >= COMPRESSION_THRESHOLD and _compressible(response):
+        encoding = _choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+
+    # Strong validator of the payload, distinct for each content coding of it
+    etag = hashlib.sha256(data).hexdigest()[:32] + ('-' + encoding if encoding else '')
+    response.set_etag(etag)
+    if 'Cache-Control' not in response.headers:
+        # Responses depend on the logged user: cache them only in the browser, always revalidated
+        response.headers['Cache-Control'] = 'private, no-cache'
+
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Length', None)
+        return response
+
+    if encoding is not None:
+        response.set_data(_compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+    return response
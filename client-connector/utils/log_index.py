@@ -0,0 +1,343 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+-------------------------
+
+Sidecar line index of the task logs, for paginated reads.
+
+Next to results/logs/<user>_<mode>_<task>.log, a '.idx' file holds a header and one fixed-size
+record per complete line of the log: the byte offset at which the line ends and its logging
+level (guessed from the text, as the task processes log bare messages). The index is extended with the lines appended since the previous read, so that any page
+of the log is found with a seek (line numbers) or a binary search (byte offsets).
+"""
+
+import configparser
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import struct
+
+from utils.logger import log_path, TERMINATION_STRING
+
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+PAGE_LINES = config.getint("LOG_BATCH", "PAGE_LINES", fallback=1000)
+MAX_PAGE_BYTES = config.getint("LOG_BATCH", "MAX_PAGE_BYTES", fallback=1024 * 1024)
+
+MAGIC = b"LIDX"
+VERSION = 1
+HEADER = struct.Struct("<4sB8s")   # magic, version, digest of the first line of the log
+RECORD = struct.Struct("<QB")      # offset of the end of the line, level
+READ_SIZE = 1024 * 1024
+
+LEVEL_TERMINATION = 255
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+# The task logs hold bare messages, or formatted ones with the level name near the start
+LEVEL_PATTERN = re.compile(rb"\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b")
+LEVEL_PREFIX = 64
+ERROR_PATTERN = re.compile(rb"^Traceback \(most recent call last\)|\w(Error|Exception)\b")
+WARNING_PATTERN = re.compile(rb"Warning\b|\b[Ww]arn(ing)?\b")
+
+
+def index_path(path):
+
+    return path + ".idx"
+
+
+def parse_level(level):
+
+    """
+    Logging level from its name or number.
+    Throws: ValueError on unknown levels
+    :param level: 'WARNING', 'warning' or '30'
+    :type level: `str`
+    :rtype: `int`
+    """
+
+    if str(level).upper() in LEVELS:
+        return LEVELS[str(level).upper()]
+    return int(level)
+
+
+def line_level(line, previous):
+
+    """
+    Guess the logging level of a log line
+    :param line: the line
+    :type line: `bytes`
+    :param previous: level of the previous line
+    :type previous: `int`
+    :rtype: `int`
+    """
+
+    match = LEVEL_PATTERN.search(line, 0, LEVEL_PREFIX)
+    if match:
+        return LEVELS[match.group(1).decode()]
+    if line[:1] in (b" ", b"\t") and previous:
+        # Continuation, e.g. the frames of a traceback
+        return previous
+    if ERROR_PATTERN.search(line):
+        return LEVELS["ERROR"]
+    if WARNING_PATTERN.search(line):
+        return LEVELS["WARNING"]
+    return LEVELS["INFO"]
+
+
+def _digest(data):
+
+    return hashlib.sha256(data).digest()[:8]
+
+
+class _Records:
+
+    """Read-only view of the records of an index file"""
+
+    def __init__(self, buffer, count):
+
+        self._buffer = buffer
+        self._count = count
+
+    def __len__(self):
+
+        return self._count
+
+    def __getitem__(self, line):
+
+        return RECORD.unpack_from(self._buffer, HEADER.size + line * RECORD.size)
+
+    def start(self, line):
+
+        return self[line - 1][0] if line > 0 else 0
+
+
+class LineIndex:
+
+    """
+    Line index of a log file, kept in its '.idx' sidecar file
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.index_path = index_path(path)
+
+    def update(self, log, index):
+
+        """
+        Index the complete lines appended to the log since the last update. The index is
+        rebuilt if the log was replaced or truncated, and extended past the termination string
+        when a new run of the task appends to the same log.
+        :param log: log file opened for binary reading
+        :param index: index file opened for binary appending and reading, locked
+        :return: the number of indexed lines
+        :rtype: `int`
+        """
+
+        index.seek(0, os.SEEK_END)
+        size = index.tell()
+        count = max(size - HEADER.size, 0) // RECORD.size
+        end, level = 0, 0
+
+        if size and not self._valid(log, index, count):
+            index.truncate(0)
+            size, count = 0, 0
+        elif size and size != HEADER.size + count * RECORD.size:
+            # A record cut by a crash
+            index.truncate(HEADER.size + count * RECORD.size)
+        if count:
+            index.seek(HEADER.size + (count - 1) * RECORD.size)
+            end, level = RECORD.unpack(index.read(RECORD.size))
+
+        log.seek(end)
+        records = []
+        pending = b""
+        while True:
+            chunk = log.read(READ_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk
+            start = 0
+            while True:
+                stop = data.find(b"\n", start) + 1
+                if not stop:
+                    break
+                line = data[start:stop]
+                if count == 0 and not records:
+                    index.write(HEADER.pack(MAGIC, VERSION, _digest(line)))
+                if line == TERMINATION_STRING.encode():
+                    level = LEVEL_TERMINATION
+                else:
+                    level = line_level(line, 0 if level == LEVEL_TERMINATION else level)
+                end += stop - start
+                records.append(RECORD.pack(end, level))
+                start = stop
+            pending = data[start:]
+            if records:
+                index.write(b"".join(records))
+                count += len(records)
+                records = []
+
+        index.flush()
+        return count
+
+    def _valid(self, log, index, count):
+
+        index.seek(0)
+        header = index.read(HEADER.size + RECORD.size)
+        if len(header) < HEADER.size + RECORD.size or count == 0:
+            return False
+        magic, version, digest = HEADER.unpack_from(header)
+        first_end, _ = RECORD.unpack_from(header, HEADER.size)
+        if magic != MAGIC or version != VERSION:
+            return False
+
+        index.seek(HEADER.size + (count - 1) * RECORD.size)
+        last_end, _ = RECORD.unpack(index.read(RECORD.size))
+        if os.fstat(log.fileno()).st_size < last_end:
+            return False
+        log.seek(0)
+        return _digest(log.read(first_end)) == digest
+
+    def page(self, offset=None, limit=None, start_line=None, lines=None, tail=None, level=None):
+
+        """
+        Read a page of complete lines of the log, updating the index first.
+        The page starts at the first line ending after byte 'offset', at line 'start_line' or
+        'tail' lines before the end, and holds up to 'lines' lines and 'limit' bytes (at least
+        one line). With 'level', only the lines of that level or above are returned.
+        Throws: FileNotFoundError if the log does not exist
+        :param offset: byte offset
+        :type offset: `int`
+        :param limit: maximum bytes of log
+        :type limit: `int`
+        :param start_line: 0-based line number
+        :type start_line: `int`
+        :param lines: maximum number of lines
+        :type lines: `int`
+        :param tail: number of lines from the end of the log
+        :type tail: `int`
+        :param level: minimum logging level
+        :type level: `int`
+        :return: 'logs' text, 'end' of the task, first and next 'line' and 'offset' to read,
+                 'total_lines' and indexed 'size' of the log
+        :rtype: `dict`
+        """
+
+        lines = PAGE_LINES if lines is None else max(lines, 0)
+        limit = MAX_PAGE_BYTES if limit is None else max(limit, 1)
+
+        with open(self.path, "rb") as log, open(self.index_path, "a+b") as index:
+            fcntl.flock(index.fileno(), fcntl.LOCK_EX)
+            count = self.update(log, index)
+            fcntl.flock(index.fileno(), fcntl.LOCK_SH)
+            if not count:
+                return {"logs": "", "end": False, "line": 0, "next_line": 0, "offset": 0, "next_offset": 0,
+                        "total_lines": 0, "size": 0}
+
+            with mmap.mmap(index.fileno(), HEADER.size + count * RECORD.size, access=mmap.ACCESS_READ) as buffer:
+                records = _Records(buffer, count)
+                # Only a termination string closing the log ends the task, not the one of a previous run
+                last = records[count - 1][1] == LEVEL_TERMINATION
+                ended = last and os.fstat(log.fileno()).st_size == records[count - 1][0]
+                total = count - 1 if last else count
+
+                if tail is not None:
+                    lines = min(lines, max(tail, 0))
+                    selected, _ = self._select(records, reversed(range(total)), level, lines, limit)
+                    selected.reverse()
+                    first = selected[0] if selected else total
+                    following = total
+                else:
+                    if start_line is not None:
+                        first = min(max(start_line, 0), total)
+                    else:
+                        first = self._bisect(records, total, offset or 0)
+                    selected, stop = self._select(records, range(first, total), level, lines, limit)
+                    following = total if stop is None else stop
+
+                text = b"".join(self._read(log, records, selected))
+                result = {"logs": text.decode("utf-8", errors="replace"),
+                          "end": ended and following == total,
+                          "line": selected[0] if selected else first,
+                          "next_line": following,
+                          "offset": records.start(selected[0] if selected else first),
+                          "next_offset": records.start(following),
+                          "total_lines": total,
+                          "size": records[total - 1][0] if total else 0}
+            return result
+
+    @staticmethod
+    def _bisect(records, total, offset):
+
+        low, high = 0, total
+        while low < high:
+            middle = (low + high) // 2
+            if records[middle][0] <= offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _select(records, candidates, level, lines, limit):
+
+        # Returns the selected lines and the line at which the scan stopped (None at the end)
+        selected = []
+        size = 0
+        for line in candidates:
+            if len(selected) >= lines:
+                return selected, line
+            end, line_level = records[line]
+            if level is not None and (line_level < level or line_level == LEVEL_TERMINATION):
+                continue
+            size += end - records.start(line)
+            if selected and size > limit:
+                return selected, line
+            selected.append(line)
+        return selected, None
+
+    @staticmethod
+    def _read(log, records, selected):
+
+        # Consecutive lines are read with a single call
+        index = 0
+        while index < len(selected):
+            last = index
+            while last + 1 < len(selected) and selected[last + 1] == selected[last] + 1:
+                last += 1
+            start = records.start(selected[index])
+            log.seek(start)
+            yield log.read(records[selected[last]][0] - start)
+            index = last + 1
+
+
+def get_log_page(user, mode, task_name, **kwargs):
+
+    """
+    A page of a task log, see :meth:`LineIndex.page`.
+    Throws: FileNotFoundError if the log does not exist
+    :rtype: `dict`
+    """
+
+    return LineIndex(log_path(user, mode, task_name)).page(**kwargs)
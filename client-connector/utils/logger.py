@@ -24,10 +24,17 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 A logger class.
 """
 
+import codecs
+import collections
+import configparser
 import logging
+import os
 import time
 import json
 import sys
+import threading
+
+from utils import file_watcher
 
 
 class Logger:
@@ -69,74 +76,411 @@ class Logger:
         self.logger.info(message)
 
 
+config = configparser.ConfigParser()
+config.read('app.ini')
+
+TERMINATION_STRING = "!x\n"
+TERMINATION_BYTES = TERMINATION_STRING.encode()
+FIRST_LOG_TIMEOUT = 1.0
+KEEPALIVE_INTERVAL = config.getfloat("LOG_STREAM", "KEEPALIVE", fallback=15.0)
+RING_BUFFER_SIZE = config.getint("LOG_STREAM", "RING_BUFFER_KB", fallback=1024) * 1024
+BROADCASTER_IDLE_TIMEOUT = config.getfloat("LOG_STREAM", "IDLE_TIMEOUT", fallback=60.0)
+
+
 def check_termination_string(text):
 
-    if text[-3:] == "!x\n":
+    if text[-3:] == TERMINATION_STRING:
 
         return True
     else:
         return False
 
 
-def get_log_stream_plain(user, mode, task_name):
+def log_path(user, mode, task_name):
 
-    path = "results/logs/" + user + "_" + mode + "_" + task_name + ".log"
+    return "results/logs/" + user + "_" + mode + "_" + task_name + ".log"
 
-    text = ""
-    end = False
 
-    try:
-        while not end:
+class LogTailer:
+    """
+    Follows a growing log file, returning only the bytes written since the previous read.
+    Only complete lines are returned (a partial last line is kept until its newline arrives),
+    and a rotated (replaced) or truncated file is followed from its beginning.
+    The byte 'position' of the returned data keeps growing across rotations: position p lies
+    at offset p - file_start of the current file.
+    The memory used does not depend on the size of the file: a poll reads at most MAX_READ
+    bytes, and sets 'more' when the file holds more to be read by the next one.
+    """
 
-            previous_text = '%s' % text
+    READ_SIZE = 64 * 1024
+    MAX_READ = 16 * READ_SIZE
+    # A partial line longer than this is returned anyway
+    MAX_PARTIAL = 1024 * 1024
 
-            time.sleep(1.0)
-            f = open(path, "r")
-            text = f.read()
-            f.close()
+    def __init__(self, path, offset=0):
+        """
+        Create a :class:`LogTailer` instance.
 
-            if len(text) > len(previous_text):
+        Parameters
+        ----------
+        path : string
+            path + filename of the log file
+        offset : int
+            byte offset from which the file is read
 
-                if check_termination_string(text):
+        """
+        self.path = path
+        self.offset = offset
+        self.ended = False
+        self.more = False
+        # Bytes returned so far, across rotations, and the position at which the current file starts
+        self.position = offset
+        self.file_start = 0
+
+        self._file = None
+        self._identity = None
+        self._partial = b""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _open(self):
+
+        self._file = open(self.path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        if self.offset > stat.st_size:
+            self.offset = 0
+        self._file.seek(self.offset)
+
+    def _read_available(self, limit):
+
+        # Returns the chunks read and whether the end of the file was reached
+        chunks = []
+        while limit > 0:
+            chunk = self._file.read(min(self.READ_SIZE, limit))
+            if not chunk:
+                return chunks, True
+            self.offset += len(chunk)
+            limit -= len(chunk)
+            chunks.append(chunk)
+        return chunks, False
+
+    def _reset(self):
+
+        self.offset = 0
+        self._partial = b""
+        self._decoder.reset()
+
+    def poll(self):
+        """
+        Read what was appended to the log since the last call. Throws an exception if the
+        file does not exist when it is first opened.
 
-                    text = text[:-3]
-                    end = True
+        Returns
+        -------
+        string
+            the new complete lines, without the termination string ('' if nothing new)
 
-                yield text[len(previous_text):]
+        """
+        return self._decoder.decode(self.read())
 
-        logging.info("Exited while loop")
-    except Exception as err:
-        logging.error(err)
-        raise err
+    def read(self):
+        """
+        As :meth:`poll`, returning the bytes read.
+        """
+        self.more = False
+        if self.ended:
+            return b""
+
+        if self._file is None:
+            self._open()
+
+        rotated = b""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None  # rotated, the new file is not there yet
+
+        if stat is not None and (stat.st_dev, stat.st_ino) == self._identity and stat.st_size < self.offset:
+            # Truncated in place
+            self._reset()
+            self._file.seek(0)
+            self.file_start = self.position
+
+        chunks, at_end = self._read_available(self.MAX_READ)
+
+        if at_end and stat is not None and (stat.st_dev, stat.st_ino) != self._identity:
+            # Rotated and the old file drained: follow the new one from its start
+            rotated = self._partial + b"".join(chunks)
+            self._file.close()
+            self._reset()
+            self._open()
+            self.file_start = self.position + len(rotated)
+            chunks, at_end = self._read_available(max(self.MAX_READ - len(rotated), self.READ_SIZE))
+
+        self.more = not at_end
+        if not chunks and not rotated:
+            return b""
+
+        data = self._partial + b"".join(chunks)
+        cut = data.rfind(b"\n") + 1
+        if cut == 0 and len(data) > self.MAX_PARTIAL:
+            cut = len(data)
+        data, self._partial = rotated + data[:cut], data[cut:]
+        self.position += len(data)
+
+        if not self._partial and data.endswith(TERMINATION_BYTES):
+            data = data[:-len(TERMINATION_BYTES)]
+            self.ended = True
+        return data
+
+    def close(self):
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LogBroadcaster:
+    """
+    Shares the tailing of a task log among all of its streams: a single thread follows the file
+    and keeps the latest chunks (raw bytes, each one at most 'capacity' bytes) in a ring buffer
+    bounded in bytes, from which every subscriber reads at its own pace. Chunks are identified by the byte position at which they end, so a
+    reconnecting client resumes after the last chunk it received (SSE Last-Event-ID); older
+    data no longer in the ring buffer is read again from the file.
+    """
+
+    def __init__(self, key, path, capacity=None):
+        """
+        Create a :class:`LogBroadcaster` instance and start following the log.
+
+        Parameters
+        ----------
+        key : tuple
+            (user, mode, task_name) of the log
+        path : string
+            path + filename of the log file
+        capacity : int
+            bytes of log kept in memory
 
+        """
+        self.key = key
+        self.path = path
+        self.capacity = RING_BUFFER_SIZE if capacity is None else capacity
+
+        self._condition = threading.Condition()
+        self._ring = collections.deque()  # (start, end, data)
+        self._ring_bytes = 0
+        self._position = 0
+        self._file_start = 0
+        self._ended = False
+        self._error = None
+        self._closed = False
+        self._subscribers = 0
+        self._idle_since = time.monotonic()
+
+        self._thread = threading.Thread(target=self._run, name='log ' + os.path.basename(path), daemon=True)
+        self._thread.start()
+
+    def _run(self):
+
+        tailer = LogTailer(self.path)
+        watch = file_watcher.watch(self.path)
+        try:
+            if not os.path.exists(self.path):
+                # Give the task process the time to create its log
+                watch.wait(FIRST_LOG_TIMEOUT)
+            while True:
+                start = tailer.position
+                data = tailer.read()
+                if data or tailer.ended:
+                    self._append(start, tailer, data)
+                    if tailer.ended:
+                        return
+                elif tailer.more:
+                    continue
+                elif not watch.wait(KEEPALIVE_INTERVAL) and self._idle():
+                    return
+        except Exception as err:
+            logging.error(err)
+            with self._condition:
+                self._error = err
+                self._condition.notify_all()
+        finally:
+            tailer.close()
+            watch.close()
+            with self._condition:
+                self._closed = True
+            _release(self)
+
+    def _append(self, start, tailer, data):
+
+        # Pieces of at most 'capacity' bytes, cut at a line end when possible
+        pieces = []
+        while len(data) > self.capacity:
+            cut = data.rfind(b"\n", 0, self.capacity) + 1 or self.capacity
+            pieces.append((start, start + cut, data[:cut]))
+            start, data = start + cut, data[cut:]
+        # The last piece also covers the termination string, which is not part of the data
+        pieces.append((start, tailer.position, data))
+
+        with self._condition:
+            for piece in pieces:
+                self._ring.append(piece)
+                self._ring_bytes += piece[1] - piece[0]
+            while len(self._ring) > 1 and self._ring_bytes > self.capacity:
+                dropped = self._ring.popleft()
+                self._ring_bytes -= dropped[1] - dropped[0]
+            self._position = tailer.position
+            self._file_start = tailer.file_start
+            self._ended = tailer.ended
+            self._condition.notify_all()
+
+    def _idle(self):
+
+        with self._condition:
+            if not self._subscribers and time.monotonic() - self._idle_since > BROADCASTER_IDLE_TIMEOUT:
+                # No more subscribers from now on
+                self._closed = True
+            return self._closed
+
+    def acquire(self):
+        """
+        Register a subscriber, to be released by :meth:`follow`.
 
-def get_log_stream(user, mode, task_name):
+        Returns
+        -------
+        bool
+            False if the broadcaster stopped following the log
 
-    path = "results/logs/" + user + "_" + mode + "_" + task_name + ".log"
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            self._subscribers += 1
+            return True
 
-    text = ""
-    end = False
+    def _read_file(self, start, end):
+        """
+        Chunks of the current file between two positions, for subscribers behind the ring buffer
+        """
+        with open(self.path, "rb") as f:
+            f.seek(start - self._file_start)
+            while start < end:
+                data = f.read(min(LogTailer.READ_SIZE, end - start))
+                if not data:
+                    return
+                start += len(data)
+                yield start, data
+
+    def follow(self, last_event_id=None):
+        """
+        Follow the log as an acquired subscriber.
+
+        Parameters
+        ----------
+        last_event_id : int
+            position of the last chunk already received, None to get the whole log
+
+        Returns
+        -------
+        generator
+            (position, text, end) for every chunk of the log, None when nothing was written
+            for KEEPALIVE seconds. The termination string is not included.
+
+        """
+        cursor = max(int(last_event_id or 0), 0)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._position > cursor or self._ended
+                                             or self._error is not None, KEEPALIVE_INTERVAL)
+                    if self._error is not None:
+                        raise self._error
+                    ring_start = self._ring[0][0] if self._ring else self._position
+                    chunks = [chunk for chunk in self._ring if chunk[1] > cursor]
+                    catch_up = cursor < ring_start and cursor >= self._file_start
+                    ended = self._ended
+                    last = self._position
+
+                if cursor < ring_start:
+                    if catch_up:
+                        for position, data in self._read_file(cursor, ring_start):
+                            yield position, decoder.decode(data), False
+                    else:
+                        logging.warning("Log %s from %d no longer available", self.path, cursor)
+                        decoder.reset()
+                    cursor = ring_start
+
+                if not chunks and not ended:
+                    yield None
+                    continue
+
+                for start, end, data in chunks:
+                    if start < cursor:
+                        # Resuming in the middle of a chunk
+                        data = data[cursor - start:]
+                    cursor = end
+                    yield end, decoder.decode(data, final=ended and end == last), ended and end == last
+                if ended:
+                    return
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+                self._idle_since = time.monotonic()
+
+
+_broadcasters_lock = threading.Lock()
+_broadcasters = {}
+
+
+def _release(broadcaster):
+
+    with _broadcasters_lock:
+        if _broadcasters.get(broadcaster.key) is broadcaster:
+            del _broadcasters[broadcaster.key]
+
+
+def subscribe(user, mode, task_name, last_event_id=None):
+    """
+    Follow a task log through its :class:`LogBroadcaster`, started by the first subscriber.
+    See :meth:`LogBroadcaster.follow`.
+    """
+    key = (user, mode, task_name)
+    with _broadcasters_lock:
+        broadcaster = _broadcasters.get(key)
+        if broadcaster is None or not broadcaster.acquire():
+            broadcaster = _broadcasters[key] = LogBroadcaster(key, log_path(user, mode, task_name))
+            broadcaster.acquire()
+
+    return broadcaster.follow(last_event_id)
+
+
+def get_log_stream_plain(user, mode, task_name):
 
     try:
-        while not end:
+        for chunk in subscribe(user, mode, task_name):
+            if chunk is not None:
+                yield chunk[1]
 
-            previous_text = '%s' % text
+        logging.info("Exited while loop")
+    except Exception as err:
+        logging.error(err)
+        raise err
 
-            time.sleep(1.0)
-            f = open(path, "r")
-            text = f.read()
-            f.close()
 
-            if len(text) > len(previous_text):
+def get_log_stream(user, mode, task_name, last_event_id=None):
 
-                if check_termination_string(text):
+    try:
+        for chunk in subscribe(user, mode, task_name, last_event_id):
 
-                    text = text[:-3]
-                    end = True
+            if chunk is None:
+                # SSE comment, ignored by the clients: finds out closed connections of idle streams
+                yield ":keepalive\n\n"
+                continue
 
-                yield "id:{_id}\ndata:{data}\n\n".format(_id=task_name,
-                                                         data=json.dumps({"line": text[len(previous_text):]}))
-                sys.stdout.flush()
+            yield "id:{_id}\ndata:{data}\n\n".format(_id=chunk[0], data=json.dumps({"line": chunk[1]}))
+            sys.stdout.flush()
         logging.info("Exited while loop")
     except Exception as err:
         logging.error(err)
@@ -146,7 +490,7 @@ def get_log_stream(user, mode, task_name):
 
 def get_log_batch(user, mode, task_name):
 
-    path = "results/logs/" + user + "_" + mode + "_" + task_name + ".log"
+    path = log_path(user, mode, task_name)
 
     try:
 
@@ -0,0 +1,363 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+-------------------------
+
+Structured training metrics of the task processes.
+
+Next to results/logs/<user>_<mode>_<task>.log, master.py and worker.py append fixed-size binary
+records (time, round, field, value) to a '.metrics' file, and the names of the fields, one per
+line, to a '.metrics.fields' sidecar (the field of a record is its line number there).
+"""
+
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+LOGS_PATH = "results/logs/"
+RECORD = struct.Struct("<dIHd")  # unix time, round, field, value
+READ_SIZE = RECORD.size * 4096
+MAX_FIELDS = 1 << (8 * struct.calcsize("<H"))
+
+DEFAULT_POINTS = 500
+
+# Validation results logged by the MMLL nodes, e.g. "Validation accuracy = 0.91"
+VALIDATION_LINE = re.compile(r"(?i)valid|accuracy|loss|auc|mse|mae|f1")
+VALIDATION_VALUE = re.compile(r"([A-Za-z][\w ]{0,40}?)\s*[=:]\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\b")
+# Metrics recorded from those lines (as 'val_<name>'), so that free text never creates new fields
+VALIDATION_METRICS = {
+    "accuracy": "accuracy", "acc": "accuracy", "balanced_accuracy": "balanced_accuracy",
+    "loss": "loss", "auc": "auc", "roc_auc": "auc", "f1": "f1", "f1_score": "f1",
+    "precision": "precision", "recall": "recall", "mse": "mse", "rmse": "rmse", "mae": "mae",
+    "r2": "r2", "kappa": "kappa",
+}
+
+
+def metrics_path(user, mode, task_name):
+
+    return LOGS_PATH + str(user) + "_" + mode + "_" + task_name + ".metrics"
+
+
+def fields_path(path):
+
+    return path + ".fields"
+
+
+def message_size(message):
+
+    """
+    Estimated payload size of a message, from the size of the arrays and buffers it holds
+    (without serializing it).
+    :param message: message sent or received
+    :return: bytes
+    :rtype: `int`
+    """
+
+    if message is None:
+        return 0
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return len(message)
+    if isinstance(message, str):
+        return len(message.encode("utf-8"))
+    if isinstance(message, (int, float, bool)):
+        return 8
+    if isinstance(message, dict):
+        return sum(message_size(key) + message_size(value) for key, value in message.items())
+    if isinstance(message, (list, tuple, set)):
+        return sum(message_size(value) for value in message)
+    nbytes = getattr(message, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(message)
+
+
+class MetricsLog:
+
+    """
+    Append-only writer of the metrics of a task process. Thread safe.
+    """
+
+    def __init__(self, path):
+
+        """
+        Create a :class:`MetricsLog` instance, starting a new metrics file.
+        :param path: path of the metrics file
+        :type path: `str`
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._fields = {}
+
+        # A new run of the task starts from scratch
+        for name in (fields_path(path), path):
+            if os.path.exists(name):
+                os.remove(name)
+        self._fields_fd = os.open(fields_path(path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _field(self, name):
+
+        field = self._fields.get(name)
+        if field is None:
+            if len(self._fields) >= MAX_FIELDS:
+                raise ValueError("Too many metrics fields in %s" % self.path)
+            field = self._fields[name] = len(self._fields)
+            # Written before any record referencing it
+            os.write(self._fields_fd, (name.replace("\n", " ") + "\n").encode("utf-8"))
+        return field
+
+    def record(self, round_number, values, timestamp=None):
+
+        """
+        Append the values of some fields.
+        :param round_number: training round the values belong to
+        :type round_number: `int`
+        :param values: field name -> number
+        :type values: `dict`
+        :param timestamp: unix time, now by default
+        :type timestamp: `float`
+        """
+
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self._fd is None:
+                return
+            data = b"".join(RECORD.pack(timestamp, round_number, self._field(name), float(value))
+                            for name, value in values.items())
+            os.write(self._fd, data)
+
+    def close(self):
+
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                os.close(self._fields_fd)
+                self._fd = None
+
+
+class MeteredComms:
+
+    """
+    Proxy of the comms object of an aggregator or participant, handed to the MMLL comms
+    wrapper. It times the send and receive calls and sizes their messages, and records per
+    round its wall time, the time spent waiting for messages, the messages and bytes exchanged.
+    A round of the aggregator starts with the first send following a receive; a round of a
+    participant with the first receive following a send.
+    """
+
+    def __init__(self, comms, metrics, aggregator=True):
+
+        """
+        Create a :class:`MeteredComms` instance.
+        :param comms: aggregator or participant comms object
+        :param metrics: destination of the metrics
+        :type metrics: :class:`MetricsLog`
+        :param aggregator: whether comms is an aggregator
+        :type aggregator: `bool`
+        """
+
+        self._comms = comms
+        self.metrics = metrics
+        self._opening = "send" if aggregator else "receive"
+
+        self._lock = threading.Lock()
+        self.round = 0
+        self._phase = None
+        self._started = None
+        self._counters = None
+
+    def __getattr__(self, name):
+
+        return getattr(self._comms, name)
+
+    def __enter__(self):
+
+        self._comms.__enter__()
+        return self
+
+    def __exit__(self, ex_type, ex_val, tb):
+
+        return self._comms.__exit__(ex_type, ex_val, tb)
+
+    def _account(self, phase, messages, size, waited=0.0):
+
+        with self._lock:
+            if phase == self._opening and self._phase != phase:
+                self._close_round()
+                self.round += 1
+                self._started = time.monotonic()
+                self._counters = {"messages_sent": 0, "bytes_sent": 0, "messages_received": 0,
+                                  "bytes_received": 0, "wait_seconds": 0.0}
+            self._phase = phase
+            if self._counters is None:
+                return  # before the first round
+            if phase == "send":
+                self._counters["messages_sent"] += messages
+                self._counters["bytes_sent"] += size
+            else:
+                self._counters["messages_received"] += messages
+                self._counters["bytes_received"] += size
+                self._counters["wait_seconds"] += waited
+
+    def _close_round(self):
+
+        if self._counters is None:
+            return
+        values = dict(self._counters)
+        values["round_seconds"] = time.monotonic() - self._started
+        self.metrics.record(self.round, values)
+        self._counters = None
+
+    def send(self, message=None, *args, **kwargs):
+
+        result = self._comms.send(message, *args, **kwargs)
+        self._account("send", 1, message_size(message))
+        return result
+
+    def send_many(self, messages=None, broadcast=None, *args, **kwargs):
+
+        result = self._comms.send_many(messages, broadcast, *args, **kwargs)
+        messages = messages or {}
+        self._account("send", len(messages) + (broadcast is not None),
+                      message_size(list(messages.values())) + message_size(broadcast))
+        return result
+
+    def receive(self, *args, **kwargs):
+
+        start = time.monotonic()
+        message = self._comms.receive(*args, **kwargs)
+        self._account("receive", 1, message_size(message), time.monotonic() - start)
+        return message
+
+    def iter_receive(self, count, timeout=None):
+
+        iterator = self._comms.iter_receive(count, timeout)
+        while True:
+            start = time.monotonic()
+            try:
+                message = next(iterator)
+            except StopIteration:
+                return
+            self._account("receive", 1, message_size(message), time.monotonic() - start)
+            yield message
+
+    def receive_many(self, count, timeout=None):
+
+        return list(self.iter_receive(count, timeout))
+
+    def close(self):
+
+        """
+        Record the round in progress and close the metrics file
+        """
+
+        with self._lock:
+            self._close_round()
+        self.metrics.close()
+
+
+class ValidationMetricsHandler(logging.Handler):
+
+    """
+    Logging handler recording the validation results logged by the MMLL nodes as metrics
+    of the current round.
+    """
+
+    def __init__(self, comms):
+
+        """
+        :param comms: metered comms of the node
+        :type comms: :class:`MeteredComms`
+        """
+
+        super().__init__(logging.INFO)
+        self.comms = comms
+
+    def emit(self, record):
+
+        try:
+            message = record.getMessage()
+            if not VALIDATION_LINE.search(message):
+                return
+            values = {}
+            for name, value in VALIDATION_VALUE.findall(message):
+                words = [word for word in re.split(r"[\s_]+", name.lower()) if word and word not in ("val", "validation")]
+                metric = VALIDATION_METRICS.get("_".join(words))
+                if metric:
+                    values["val_" + metric] = float(value)
+            if values:
+                self.comms.metrics.record(self.comms.round, values)
+        except Exception:
+            self.handleError(record)
+
+
+def read_series(path, fields=None, points=DEFAULT_POINTS):
+
+    """
+    Time series of the metrics of a task, each one downsampled to at most 'points' points
+    (the mean of consecutive records; time and round are those of the last one).
+    Throws: FileNotFoundError if the task has no metrics
+    :param path: path of the metrics file
+    :type path: `str`
+    :param fields: names of the fields to return, all by default
+    :type fields: `list`
+    :param points: maximum points per series
+    :type points: `int`
+    :return: 'fields' recorded, 'records' count and 'series': field -> 't', 'round', 'value' lists
+    :rtype: `dict`
+    """
+
+    with open(fields_path(path), "r", encoding="utf-8") as f:
+        names = f.read().splitlines()
+    wanted = set(range(len(names))) if not fields else {names.index(name) for name in fields if name in names}
+
+    columns = {field: ([], [], []) for field in wanted}
+    records = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_SIZE)
+            # A record being written is left out
+            complete = len(data) - len(data) % RECORD.size
+            for timestamp, round_number, field, value in RECORD.iter_unpack(data[:complete]):
+                records += 1
+                if field in columns:
+                    column = columns[field]
+                    column[0].append(timestamp)
+                    column[1].append(round_number)
+                    column[2].append(value)
+            if len(data) < READ_SIZE:
+                break
+
+    series = {}
+    points = max(int(points), 1)
+    for field, (times, rounds, values) in columns.items():
+        step = max(-(-len(values) // points), 1)
+        buckets = [(start, min(start + step, len(values))) for start in range(0, len(values), step)]
+        series[names[field]] = {"t": [times[end - 1] for _, end in buckets],
+                                "round": [rounds[end - 1] for _, end in buckets],
+                                "value": [sum(values[start:end]) / (end - start) for start, end in buckets]}
+
+    return {"fields": names, "records": records, "series": series}
@@ -23,31 +23,236 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
 import communication_abstract_interface as ffl
+import collections
 import importlib
 import json
 import configparser
+import os
+import threading
+import time
 import utils.serializer as serializer
 
 config = configparser.ConfigParser()
 config.read('app.ini')
 COMM_CONFIG_PATH = config["LIBRARIES"]["COMM_CONFIG_PATH"]
 
+# Platform keys ending with this suffix register the asyncio classes of the comms module
+ASYNC_PLATFORM_SUFFIX = '_async'
+
+# Maximum number of platform contexts kept for reuse across requests
+CONTEXT_CACHE_SIZE = 64
+# Seconds a context no longer cached is left open for the requests still using it
+RETIRED_CONTEXT_GRACE = 60.0
+
+_lock = threading.RLock()
+_comms = {"stamp": None, "module": None}
+_registered = {}
+_contexts = collections.OrderedDict()
+_holders = {}  # id(context) -> [context, number of holders]
+_retired = []  # (time it left the cache, context), closed once released and past the grace period
+
+
+def _stamp(path):
+    """
+    Modification time and size of a file, None if it cannot be read
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def invalidate():
+    """
+    Forget the resolved comms module and every cached platform context,
+    e.g. after the comms configuration has been changed
+    """
+    with _lock:
+        _comms["stamp"] = None
+        _comms["module"] = None
+        _registered.clear()
+        _clear_contexts()
+        expired = _sweep()
+
+    for context in expired:
+        _close(context)
+
+
+def _clear_contexts() -> None:
+
+    for _, _, context in _contexts.values():
+        _retire(context)
+    _contexts.clear()
+
+
+def _retire(context) -> None:
+
+    _retired.append((time.monotonic(), context))
+
+
+def _sweep() -> list:
+    """
+    Retired contexts to be closed now: not held and retired more than the grace period ago
+    """
+    now = time.monotonic()
+    expired = []
+    for retired in list(_retired):
+        retired_at, context = retired
+        if id(context) in _holders or now - retired_at < RETIRED_CONTEXT_GRACE:
+            continue
+        _retired.remove(retired)
+        expired.append(context)
+    return expired
+
 
 def get_comms_module():
+    """
+    Comms module named in the comms configuration, read again only when the file changes
+    Throws: An exception on failure
+    """
+    stamp = _stamp(COMM_CONFIG_PATH)
 
-    with open(COMM_CONFIG_PATH) as json_file:
-        module_name = json.load(json_file)["comms_module"]
+    with _lock:
+        if _comms["module"] is not None and stamp is not None and stamp == _comms["stamp"]:
+            return _comms["module"]
 
-    return importlib.import_module(module_name)
+        with open(COMM_CONFIG_PATH) as json_file:
+            module_name = json.load(json_file)["comms_module"]
 
+        module = importlib.import_module(module_name)
+        _registered.clear()
+        _clear_contexts()
+        _comms["stamp"] = stamp
+        _comms["module"] = module
+        return module
 
-def platform(credentials: str = None, user: str = None, password: str = None, config: str = 'cloud'):
 
-    fflapi = get_comms_module()
+def _register(fflapi, config: str) -> None:
+
+    if _registered.get(config) is fflapi:
+        return
+
+    if config.endswith(ASYNC_PLATFORM_SUFFIX):
+        if not hasattr(fflapi, 'AsyncUser'):
+            raise ValueError(fflapi.__name__ + " does not provide asyncio classes")
+        ffl.Factory.register(config, fflapi.Context, fflapi.AsyncUser, fflapi.AsyncAggregator, fflapi.AsyncParticipant)
+    else:
+        ffl.Factory.register(config, fflapi.Context, fflapi.User, fflapi.Aggregator, fflapi.Participant)
+    _registered[config] = fflapi
 
-    ffl.Factory.register(config, fflapi.Context, fflapi.User, fflapi.Aggregator, fflapi.Participant)
+
+def _new_context(credentials, user: str, password: str, config: str):
 
     try:
         return ffl.Factory.context(config, credentials, user, password, encoder=serializer.Base64Serializer)
     except:
         return ffl.Factory.context(config, credentials, user=user, password=password)
+
+
+def _close(context) -> None:
+
+    close = getattr(context, 'close', None)
+    if close is not None:
+        close()
+
+
+def acquire(credentials: str = None, user: str = None, password: str = None, config: str = 'cloud'):
+    """
+    Platform context of a user (see :func:`platform`), held until :func:`release`:
+    a held context is not closed when it leaves the cache.
+    Throws: An exception on failure
+    :return: platform context
+    """
+    with _lock:
+        context = _platform(credentials, user, password, config)
+        _holders.setdefault(id(context), [context, 0])[1] += 1
+        expired = _sweep()
+
+    for retired in expired:
+        _close(retired)
+    return context
+
+
+def release(context) -> None:
+    """
+    Release a context obtained with :func:`acquire`. It is closed once its last holder
+    released it and it has left the cache for more than RETIRED_CONTEXT_GRACE seconds.
+    :param context: platform context
+    """
+    with _lock:
+        holder = _holders.get(id(context))
+        if holder is not None and holder[0] is context:
+            holder[1] -= 1
+            if holder[1] <= 0:
+                del _holders[id(context)]
+        expired = _sweep()
+
+    for retired in expired:
+        _close(retired)
+
+
+def platform(credentials: str = None, user: str = None, password: str = None, config: str = 'cloud'):
+    """
+    Platform context of a user. Contexts are reused across calls with the same platform key,
+    credentials file and user, until the comms configuration or the credentials file change.
+    Throws: An exception on failure
+    :param credentials: path of the JSON credentials file (or the credentials themselves)
+    :param user: user name
+    :param password: user password
+    :param config: platform key
+    :return: platform context
+    """
+    with _lock:
+        context = _platform(credentials, user, password, config)
+        expired = _sweep()
+
+    for retired in expired:
+        _close(retired)
+    return context
+
+
+def _platform(credentials, user: str, password: str, config: str):
+
+    with _lock:
+        fflapi = get_comms_module()
+        _register(fflapi, config)
+
+        if credentials is not None and not isinstance(credentials, str):
+            # Not cached: closed after the grace period, unless held
+            context = _new_context(credentials, user, password, config)
+            _retire(context)
+            return context
+
+        key = (config, credentials, user)
+        stamp = _stamp(credentials)
+        entry = _contexts.get(key)
+        if entry is not None and entry[0] == password and entry[1] == stamp:
+            _contexts.move_to_end(key)
+            return entry[2]
+
+        if entry is not None:
+            # New password or credentials
+            _retire(entry[2])
+        context = _new_context(credentials, user, password, config)
+        _contexts[key] = (password, stamp, context)
+        _contexts.move_to_end(key)
+        while len(_contexts) > CONTEXT_CACHE_SIZE:
+            _retire(_contexts.popitem(last=False)[1][2])
+        return context
+
+
+def platform_user(credentials: str = None, user: str = None, password: str = None, client=None):
+    """
+    Platform user client: the one of the logged session if given, a new one otherwise.
+    Throws: An exception on failure
+    :param credentials: path of the JSON credentials file
+    :param user: user name
+    :param password: user password
+    :param client: platform user client of the logged session
+    :return: platform user client
+    """
+    if client is not None:
+        return client
+
+    return ffl.Factory.user(platform(credentials, user, password))
@@ -0,0 +1,103 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+"""
+Warm interpreter for master.py and worker.py launches (see services/fml/warm_pool.py).
+
+The heavy libraries used by the Federated Machine Learning scripts are imported up front, then
+'ready' is written to stdout and the process blocks until a launch request arrives on stdin:
+a single JSON line {"argv": ["master.py", "--task_name", ...]}. The script is then run as
+__main__ with that argv, exactly as if it had been started from the command line.
+"""
+
+import importlib
+import json
+import logging
+import os
+import runpy
+import sys
+import time
+
+# Modules imported before the interpreter is declared ready
+PRELOAD_MODULES = [
+    'numpy', 'pandas', 'sklearn', 'sklearn.decomposition', 'sklearn.metrics', 'matplotlib.pyplot', 'seaborn',
+    'data_connector.data_connector', 'utils.charts_utils', 'utils.compressor', 'communication',
+    'services.preprocessing.preprocessing', 'services.fml.crypto.crypt_PHE', 'services.cc.configuration'
+]
+
+# MMLL classes (and through them TensorFlow) configured in the MMLL configuration file
+PRELOAD_MMLL_CLASSPATHS = [
+    'mmll_masternode_classpath', 'mmll_workernode_classpath',
+    'mmll_comms_master_wrapper_classpath', 'mmll_comms_worker_wrapper_classpath'
+]
+
+SCRIPTS = ('master.py', 'worker.py')
+
+logger = logging.getLogger('warm worker')
+
+
+def preload():
+
+    start = time.monotonic()
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as err:
+            logger.warning('Preload of %s failed: %s', name, err)
+
+    try:
+        from services.cc.configuration import get_mmll_class_from_classpath
+        for key in PRELOAD_MMLL_CLASSPATHS:
+            get_mmll_class_from_classpath(key)
+    except Exception as err:
+        logger.warning('Preload of the MMLL classes failed: %s', err)
+
+    return time.monotonic() - start
+
+
+def main():
+
+    seconds = preload()
+
+    sys.stdout.write('ready %.3f\n' % seconds)
+    sys.stdout.flush()
+
+    line = sys.stdin.readline()
+    if not line:
+        return 0  # released by the pool without a launch
+
+    request = json.loads(line)
+    argv = request["argv"]
+    if not argv or os.path.basename(argv[0]) not in SCRIPTS:
+        raise ValueError('Not a launchable script: %s' % argv[:1])
+
+    sys.argv = list(argv)
+    runpy.run_path(argv[0], run_name='__main__')
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -24,6 +24,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from data_connector.data_connector import CsvConnector, PklConnector
 from utils.charts_utils import create_chart
+from utils.metrics_log import MetricsLog, MeteredComms, ValidationMetricsHandler, metrics_path
 from communication import create_participant_communication
 from services.cc.configuration import get_mmll_class_from_classpath
 
@@ -219,11 +220,18 @@ def main():
             task_definition[key] = json.dumps(value)  # to manage JSON parameter
     logging.info(task_name + ": object comms instantited")
 
+    # Round times, waits and traffic, and the validation results, recorded as metrics
+    metered_comms = MeteredComms(comms, MetricsLog(metrics_path(user, 'participant', task_name)), aggregator=False)
+    logger.addHandler(ValidationMetricsHandler(metered_comms))
+
     # Instantiate wrapper Communication object
-    wrapper_comms = wrapper_comms_class(comms)
+    wrapper_comms = wrapper_comms_class(metered_comms)
 
     # Run 'worker' participant
-    run_worker_node(wrapper_comms, workernode_class, task_definition, datasets, task_name, user)
+    try:
+        run_worker_node(wrapper_comms, workernode_class, task_definition, datasets, task_name, user)
+    finally:
+        metered_comms.close()
 
 
 if __name__ == "__main__":
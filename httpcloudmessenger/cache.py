@@ -0,0 +1,210 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import copy
+import threading
+import time
+
+
+# Read-only endpoints whose replies can be served from the cache
+CACHEABLE_ENDPOINTS = frozenset([
+    'task_listing', 'task_info', 'task_participants', 'user_assignments', 'user_tasks',
+    'model_listing', 'model_lineage'
+])
+
+# Endpoints changing tasks or models: every cached reply is dropped when one of them is called
+INVALIDATING_ENDPOINTS = frozenset([
+    'create_task', 'task_update', 'task_start', 'task_stop', 'task_quit', 'task_assignment_join',
+    'model_delete', 'model_upload_commit'
+])
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 5.0
+
+
+class ResponseCache:
+    """
+    Thread safe LRU cache of platform replies, with a time to live per entry.
+    Replies are copied in and out, so callers are free to modify what they get.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        """
+        Class initializer
+        :param max_entries: maximum number of cached replies
+        :type max_entries: `int`
+        """
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of invalidations so far; a reply fetched across an invalidation is not cached
+        :rtype: `int`
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """
+        Look up a reply
+        :param key: hashable cache key
+        :return: (True, reply) on a hit, (False, None) otherwise
+        :rtype: `tuple`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return False, None
+
+        return True, copy.deepcopy(value)
+
+    def put(self, key, value, ttl: float, generation: int = None) -> None:
+        """
+        Store a reply
+        :param key: hashable cache key
+        :param value: reply to be cached
+        :param ttl: time to live in seconds
+        :type ttl: `float`
+        :param generation: generation read before fetching the reply (see :attr:`generation`)
+        :type generation: `int`
+        """
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self) -> None:
+        """
+        Drop every cached reply
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        """
+        Returns hit, miss, eviction and invalidation counters
+        :return: cache counters
+        :rtype: `dict`
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+class _Call:
+    """A call in flight and the callers waiting for its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into a single one: while a call for a key is
+    in flight, further callers with the same key wait for it and share its outcome.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, function):
+        """
+        Run 'function', or wait for the identical call already in flight.
+        Throws: the error raised by the call
+        :param key: hashable key identifying identical calls
+        :param function: function performing the call
+        :return: the result of the call (a private copy for the callers that waited)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self._stats["calls"] += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = function()
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            if call.error is None and waiters:
+                # Snapshot before the leader's caller can modify the result
+                call.result = copy.deepcopy(result)
+            call.done.set()
+
+        return result
+
+    def stats(self) -> dict:
+        """
+        Returns the number of calls performed and of callers served by a call already in flight
+        :return: counters
+        :rtype: `dict`
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+# Shared by every context of the process: the controller builds short-lived contexts per request
+RESPONSE_CACHE = ResponseCache()
+IN_FLIGHT = SingleFlight()
@@ -0,0 +1,183 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+-------------------------
+
+Chunked, resumable transfer of large models.
+
+A model is moved as a sequence of fixed-size chunks, each one carrying its sequence number and
+SHA-256 digest, so that at most one chunk is held in memory and an interrupted transfer restarts
+from the first chunk the other side is missing instead of from the beginning.
+
+Upload:   model_upload_status -> model_upload_chunk (xN) -> model_upload_commit
+Download: model_download_info -> model_download_chunk (xN)
+
+These endpoints are an extension of the platform API: the server must implement them, so the
+messenger only stages the models of task_start/task_stop this way when 'chunked_models' is set.
+"""
+
+import hashlib
+import logging
+
+
+LOGGER = logging.getLogger(__package__)
+
+CHUNKED_TRANSFER_KEY = '__chunked_transfer__'
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_CHUNKED_THRESHOLD = 64 * 1024 * 1024
+
+
+def _sha256(data) -> str:
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+class ChunkedTransfer:
+    """
+    Moves a model between a local buffer or file and the platform, chunk by chunk.
+    Failed calls are retried by the retry policy of the transport ('model_upload_*' and
+    'model_download_*' are idempotent endpoints).
+    """
+
+    def __init__(self, invoke, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Class initializer
+        :param invoke: blocking function sending a message to the platform and returning its reply
+        :param chunk_size: chunk size in bytes
+        :type chunk_size: `int`
+        """
+        self.invoke = invoke
+        self.chunk_size = chunk_size
+
+    def _call(self, message: dict) -> dict:
+
+        return self.invoke(dict(message))
+
+    def _chunks(self, source):
+        """
+        Yield the chunks of a bytes-like object (without copies) or of a readable binary file
+        """
+        if hasattr(source, 'read'):
+            while True:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            view = memoryview(source).cast('B')
+            for offset in range(0, len(view), self.chunk_size):
+                yield view[offset:offset + self.chunk_size]
+
+    def _rewind(self, source) -> None:
+
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    def upload(self, task_name: str, source) -> dict:
+        """
+        Upload a model, skipping the chunks already stored by the platform.
+        Throws: An exception on failure
+        :param task_name: name of the task
+        :type task_name: `str`
+        :param source: serialized model, as bytes-like object or seekable binary file
+        :return: reference to the uploaded model, to be sent in place of the model itself
+        :rtype: `dict`
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        self._rewind(source)
+        for chunk in self._chunks(source):
+            hasher.update(chunk)
+            size += len(chunk)
+        digest = 'sha256:' + hasher.hexdigest()
+        total = max((size + self.chunk_size - 1) // self.chunk_size, 1)
+
+        # Same model and chunking, same transfer: a restarted upload resumes where it stopped
+        transfer_id = hashlib.sha256(('%s|%s|%d' % (task_name, digest, self.chunk_size)).encode('utf-8')).hexdigest()
+
+        status = self._call({"endpoint": "model_upload_status", "task_name": task_name,
+                             "transfer_id": transfer_id}) or {}
+        received = set(status.get("received", []))
+        if received:
+            LOGGER.info('Resuming upload %s: %d of %d chunks already stored', transfer_id, len(received), total)
+
+        self._rewind(source)
+        for seq, chunk in enumerate(self._chunks(source)):
+            if seq in received:
+                continue
+            self._call({"endpoint": "model_upload_chunk", "task_name": task_name, "transfer_id": transfer_id,
+                        "seq": seq, "total": total, "chunk": chunk, "chunk_digest": _sha256(chunk)})
+
+        self._call({"endpoint": "model_upload_commit", "task_name": task_name, "transfer_id": transfer_id,
+                    "size": size, "total": total, "digest": digest})
+
+        return {CHUNKED_TRANSFER_KEY: transfer_id, "size": size, "digest": digest}
+
+    def download(self, task_name: str, sink) -> dict:
+        """
+        Download the model of a task into 'sink'. If the sink is readable and already holds
+        part of the model (e.g. a file left by an interrupted download), the transfer resumes
+        from the first missing chunk.
+        Throws: An exception on failure
+        :param task_name: name of the task
+        :type task_name: `str`
+        :param sink: writable binary file
+        :return: transfer details ('size', 'digest', 'total', 'chunk_size')
+        :rtype: `dict`
+        """
+        info = self._call({"endpoint": "model_download_info", "task_name": task_name,
+                           "chunk_size": self.chunk_size})
+        chunk_size = int(info.get("chunk_size", self.chunk_size))
+        total = int(info["total"])
+        size = int(info["size"])
+
+        hasher = hashlib.sha256()
+        start = 0
+        readable = getattr(sink, 'readable', lambda: False)()
+        if readable and hasattr(sink, 'seek'):
+            sink.seek(0)
+            while start < total:
+                expected = min(chunk_size, size - start * chunk_size)
+                chunk = sink.read(expected)
+                if len(chunk) < expected:
+                    break
+                hasher.update(chunk)
+                start += 1
+            sink.seek(min(start * chunk_size, size))
+            sink.truncate()
+            if start:
+                LOGGER.info('Resuming download of %s model from chunk %d of %d', task_name, start, total)
+
+        for seq in range(start, total):
+            reply = self._call({"endpoint": "model_download_chunk", "task_name": task_name,
+                                "transfer_id": info.get("transfer_id"), "seq": seq})
+            chunk = reply["chunk"]
+            if "chunk_digest" in reply and _sha256(chunk) != reply["chunk_digest"]:
+                raise ValueError('Corrupted chunk %d of %s model' % (seq, task_name))
+            sink.write(chunk)
+            hasher.update(chunk)
+
+        digest = 'sha256:' + hasher.hexdigest()
+        if info.get("digest") and digest != info["digest"]:
+            raise ValueError('Digest mismatch for %s model: %s != %s' % (task_name, digest, info["digest"]))
+
+        return info
@@ -0,0 +1,206 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import logging
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    # Response codings the installed urllib3 can decode (br and zstd only with their decoders)
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = 'gzip,deflate'
+
+
+LOGGER = logging.getLogger(__package__)
+
+DEFAULT_THRESHOLD = 32 * 1024
+DEFAULT_ALGORITHMS = ['zstd', 'gzip']
+
+MODE_AUTO = 'auto'  # compress once the data app advertises the coding (RFC 7694)
+MODE_ON = 'on'
+MODE_OFF = 'off'
+
+
+def _gzip_compress(data: bytes, level: int = None) -> bytes:
+    return gzip.compress(data, compresslevel=6 if level is None else level)
+
+
+def _zstd_compress(data: bytes, level: int = None) -> bytes:
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+
+CODECS = {'gzip': _gzip_compress}
+if zstandard is not None:
+    CODECS['zstd'] = _zstd_compress
+
+
+class PayloadCompressor:
+    """
+    Chooses the content coding of the request bodies sent to the data app
+    and keeps size, ratio and time counters per endpoint.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Class initializer
+        :param config: connection details; optional keys are 'compression' ('auto', 'on' or 'off'),
+                       'compression_threshold' (minimum body size in bytes), 'compression_algorithms'
+                       (codings by preference) and 'compression_level'
+        :type config: `dict`
+        """
+        self.mode = config.get('compression', MODE_AUTO)
+        self.threshold = int(config.get('compression_threshold', DEFAULT_THRESHOLD))
+        self.level = config.get('compression_level', None)
+        self.algorithms = [name for name in config.get('compression_algorithms', DEFAULT_ALGORITHMS)
+                           if name in CODECS]
+
+        self._lock = threading.Lock()
+        self._advertised = set()
+        self._rejected = set()
+        self._stats = {}
+
+    def accept_encoding(self) -> str:
+        """
+        Value of the 'Accept-Encoding' request header: only the response codings that
+        requests/urllib3 can decode, whatever codings are used for the request bodies
+        :rtype: `str`
+        """
+        return ACCEPT_ENCODING
+
+    def encode(self, body: bytes):
+        """
+        Compress 'body' if it is above the size threshold and a coding is available.
+        The request is accounted by :meth:`record_request` once it is sent.
+        :param body: serialized request body
+        :type body: `bytes`
+        :return: the body to be sent, its content coding (None if not compressed) and the
+                 seconds spent compressing it
+        :rtype: `tuple`
+        """
+        encoding = self._choose(len(body))
+        if encoding is None:
+            return body, None, 0.0
+
+        start = time.monotonic()
+        data = CODECS[encoding](body, self.level)
+        return data, encoding, time.monotonic() - start
+
+    def _choose(self, size: int):
+
+        if self.mode == MODE_OFF or size < self.threshold:
+            return None
+
+        with self._lock:
+            for name in self.algorithms:
+                if name in self._rejected:
+                    continue
+                if self.mode == MODE_ON or name in self._advertised:
+                    return name
+        return None
+
+    def negotiate(self, response) -> None:
+        """
+        Learn the request codings accepted by the data app from a response
+        :param response: response of the data app
+        :type response: :class:`requests.Response`
+        """
+        accepted = response.headers.get('Accept-Encoding')
+        if not accepted:
+            return
+
+        names = {item.split(';')[0].strip().lower() for item in accepted.split(',')}
+        with self._lock:
+            self._advertised = names
+
+    def reject(self, encoding: str) -> None:
+        """
+        Stop using a coding the data app refused (HTTP 415)
+        :param encoding: content coding
+        :type encoding: `str`
+        """
+        LOGGER.info('Request coding %s refused by the data app, disabled', encoding)
+        with self._lock:
+            self._rejected.add(encoding)
+
+    def record_request(self, endpoint: str, size: int, wire_size: int = None, seconds: float = 0.0) -> None:
+        """
+        Account a request body
+        :param endpoint: service endpoint
+        :type endpoint: `str`
+        :param size: body size in bytes
+        :type size: `int`
+        :param wire_size: size sent after content coding, 'size' if not compressed
+        :type wire_size: `int`
+        :param seconds: time spent compressing the body
+        :type seconds: `float`
+        """
+        self._record(endpoint, raw_out=size, wire_out=size if wire_size is None else wire_size, seconds=seconds)
+
+    def record_response(self, endpoint: str, response) -> None:
+        """
+        Account the size of a response, before and after content decoding
+        :param endpoint: service endpoint
+        :type endpoint: `str`
+        :param response: response of the data app
+        :type response: :class:`requests.Response`
+        """
+        raw = len(response.content)
+        wire = int(response.headers.get('Content-Length', raw))
+        self._record(endpoint, raw_in=raw, wire_in=wire)
+
+    def _record(self, endpoint: str, raw_out: int = 0, wire_out: int = 0, raw_in: int = 0, wire_in: int = 0,
+                seconds: float = 0.0) -> None:
+
+        with self._lock:
+            counters = self._stats.setdefault(endpoint, {"requests": 0, "raw_bytes_out": 0, "wire_bytes_out": 0,
+                                                         "raw_bytes_in": 0, "wire_bytes_in": 0,
+                                                         "compress_seconds": 0.0})
+            counters["requests"] += 1 if raw_out else 0
+            counters["raw_bytes_out"] += raw_out
+            counters["wire_bytes_out"] += wire_out
+            counters["raw_bytes_in"] += raw_in
+            counters["wire_bytes_in"] += wire_in
+            counters["compress_seconds"] += seconds
+
+    def stats(self) -> dict:
+        """
+        Returns per endpoint counters, with the achieved compression ratio (raw / wire size)
+        :return: endpoint -> counters
+        :rtype: `dict`
+        """
+        with self._lock:
+            stats = {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+
+        for counters in stats.values():
+            counters["ratio_out"] = counters["raw_bytes_out"] / counters["wire_bytes_out"] \
+                if counters["wire_bytes_out"] else 1.0
+            counters["ratio_in"] = counters["raw_bytes_in"] / counters["wire_bytes_in"] \
+                if counters["wire_bytes_in"] else 1.0
+        return stats
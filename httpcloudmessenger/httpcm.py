@@ -21,16 +21,42 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import asyncio
+import collections
+import functools
+import json
 import logging
-import requests
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import NamedTuple
 
 import communication_abstract_interface as fflabc
+from httpcloudmessenger.cache import RESPONSE_CACHE, IN_FLIGHT, CACHEABLE_ENDPOINTS, INVALIDATING_ENDPOINTS, \
+    DEFAULT_CACHE_TTL
+from httpcloudmessenger.chunked import ChunkedTransfer, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNKED_THRESHOLD
+from httpcloudmessenger.multipart import encode_payload, decode_response, to_binary, from_binary, BINARY_FIELDS
+from httpcloudmessenger.transport import Transport
 
 
 logging.getLogger("httpcloudmessenger").setLevel(logging.CRITICAL)
 LOGGER = logging.getLogger(__package__)
 
 
+# Loop of the calling coroutine (asyncio.get_running_loop is only available from Python 3.7)
+_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+# Endpoints whose 'model' is uploaded in chunks first when it is a large binary payload
+MODEL_ENDPOINTS = ('task_start', 'task_stop')
+
+
+class SendReport(NamedTuple):
+    """Outcome of one of the sends of a batch"""
+    success: bool
+    elapsed: float
+    error: Exception = None
+
+
 class Context(fflabc.AbstractContext):
     """
     Class holding connection details for an FFL service
@@ -41,13 +67,53 @@ class Context(fflabc.AbstractContext):
         self.user = user
         self.password = password
 
+        self._lock = threading.Lock()
+        self._transport = None
+
     def __enter__(self):
-        self
+        return self
 
     def __exit__(self, ex_type, ex_val, tb):
         if ex_type is None:
             return True
 
+    @property
+    def transport(self) -> Transport:
+        """
+        HTTP transport shared by every messenger created on this context
+        :rtype: :class:`.Transport`
+        """
+        with self._lock:
+            if self._transport is None:
+                self._transport = Transport(self.config)
+            return self._transport
+
+    @property
+    def cache(self):
+        """
+        Response cache of the read-only endpoints, shared by all the contexts of the process
+        :rtype: :class:`.ResponseCache`
+        """
+        return RESPONSE_CACHE
+
+    @property
+    def single_flight(self):
+        """
+        Coalescing of the concurrent identical read-only calls, shared by all the contexts of the process
+        :rtype: :class:`.SingleFlight`
+        """
+        return IN_FLIGHT
+
+    def close(self) -> None:
+        """
+        Release the pooled connections held by this context
+        """
+        with self._lock:
+            transport, self._transport = self._transport, None
+
+        if transport is not None:
+            transport.close()
+
 
 class Messenger:
     """
@@ -74,6 +140,8 @@ class Messenger:
     def _invoke_service(self, message: dict) -> dict:
         """
         Send a message and wait for a reply or until timeout.
+        Replies of read-only endpoints are served from the response cache while fresh,
+        and concurrent identical reads share a single request.
         Throws: An exception on failure
         :param message: message to be sent
         :type message: `dict`
@@ -81,36 +149,140 @@ class Messenger:
         :rtype: `dict`
         """
 
-        payload = {}
-
         config = self.context.config
-        user_name = self.context.user
-        password = self.context.password
-
-        data_app_url = config.get('data_app_url', None)
-        server_url = config.get('server_url', None)
         endpoint = message['endpoint']
 
-        if not data_app_url:
+        if not config.get('data_app_url', None):
             raise Exception("'data_app_url' must be specified")
-        if not server_url:
+        if not config.get('server_url', None):
             raise Exception("'server_url' must be specified")
         if not endpoint:
             raise Exception("'endpoint' must be specified")
 
-        session = requests.Session()
-        session.headers.update({'content-type': 'application/json'})
-        message['username'] = user_name
-        message['password'] = password
+        if endpoint in CACHEABLE_ENDPOINTS:
+            key = (config['server_url'], self.context.user, self.context.password,
+                   json.dumps(message, sort_keys=True, default=str))
+
+            ttl = float(config.get('cache_ttl', DEFAULT_CACHE_TTL))
+            if ttl > 0:
+                hit, reply = RESPONSE_CACHE.get(key)
+                if hit:
+                    return reply
+
+            # Identical reads already on the wire are joined instead of being sent again
+            generation = RESPONSE_CACHE.generation
+            reply = IN_FLIGHT.do(key, functools.partial(self._send, message))
+            if ttl > 0:
+                RESPONSE_CACHE.put(key, reply, ttl, generation)
+            return reply
+
+        if endpoint in INVALIDATING_ENDPOINTS:
+            try:
+                return self._send(message)
+            finally:
+                RESPONSE_CACHE.invalidate()
+
+        return self._send(message)
+
+    def _send(self, message: dict) -> dict:
+        """
+        Post a message to the data app, applying the retry policy of its endpoint.
+        Throws: An exception on failure
+        :param message: message to be sent
+        :type message: `dict`
+        :return: received message
+        :rtype: `dict`
+        """
+
+        payload = {}
+
+        config = self.context.config
+        data_app_url = config['data_app_url']
+        endpoint = message['endpoint']
+
+        # Models travel as pickled binary parts when the data app accepts multipart messages
+        multipart_url = config.get('multipart_url', None)
+        binary_field = BINARY_FIELDS.get(endpoint) if multipart_url else None
+
+        if endpoint in MODEL_ENDPOINTS:
+            model = message.get('model')
+            message['model'] = self._stage_model(message['task_name'], model)
+            if message['model'] is not model:
+                binary_field = None  # staged in chunks, the reference is sent instead
 
-        payload["payload": message]
-        payload['Forward-To'] = server_url+endpoint
+        if binary_field and message.get(binary_field) is not None:
+            message[binary_field] = to_binary(message[binary_field])
 
-        response = session.post(data_app_url, json=payload, verify=False)
-        response.raise_for_status()
-        session.close()
+        message['username'] = self.context.user
+        message['password'] = self.context.password
 
-        return response.json()
+        payload['payload'] = message
+        payload['Forward-To'] = config['server_url']+endpoint
+
+        # Bytes values (e.g. serialized models) travel as raw multipart parts, not inside the JSON
+        body, parts = encode_payload(payload)
+        transport = self.context.transport
+        if parts and not multipart_url:
+            raise Exception("'multipart_url' must be specified to send binary values")
+
+        def attempt():
+            if parts:
+                response = transport.post_multipart(multipart_url, body, parts, endpoint)
+            else:
+                response = transport.post_json(data_app_url, body, endpoint)
+            response.raise_for_status()
+            return response
+
+        reply = decode_response(transport.retry_policy.call(endpoint, attempt))
+        return from_binary(reply) if multipart_url else reply
+
+    def _chunked_transfer(self) -> ChunkedTransfer:
+
+        config = self.context.config
+        return ChunkedTransfer(functools.partial(Messenger._invoke_service, self),
+                               chunk_size=int(config.get('chunk_size', DEFAULT_CHUNK_SIZE)))
+
+    def _stage_model(self, task_name: str, model):
+        """
+        Upload a large binary model (bytes-like or binary file) in chunks and return the
+        reference to be sent in its place, when 'chunked_models' is enabled: the chunk
+        endpoints are not part of the platform API and must be provided by the server.
+        """
+        if not self.context.config.get('chunked_models', False):
+            return model
+
+        if hasattr(model, 'read'):
+            return self._chunked_transfer().upload(task_name, model)
+
+        threshold = int(self.context.config.get('chunked_threshold', DEFAULT_CHUNKED_THRESHOLD))
+        if isinstance(model, (bytes, bytearray, memoryview)) and memoryview(model).nbytes >= threshold:
+            return self._chunked_transfer().upload(task_name, model)
+
+        return model
+
+    def upload_model(self, task_name: str, source) -> dict:
+        """
+        Upload a serialized model in resumable chunks.
+        Throws: An exception on failure
+        :param task_name: name of the task
+        :type task_name: `str`
+        :param source: serialized model, as bytes-like object or seekable binary file
+        :return: reference to the uploaded model, to be used as 'model' of task_start/task_stop
+        :rtype: `dict`
+        """
+        return self._chunked_transfer().upload(task_name, source)
+
+    def download_model(self, task_name: str, sink) -> dict:
+        """
+        Download the model of a task in resumable chunks.
+        Throws: An exception on failure
+        :param task_name: name of the task
+        :type task_name: `str`
+        :param sink: writable binary file; if readable, a partial download already in it is resumed
+        :return: transfer details
+        :rtype: `dict`
+        """
+        return self._chunked_transfer().download(task_name, sink)
 
     def user_change_password(self, user_name: str, password: str) -> None:
         """
@@ -235,6 +407,18 @@ class Messenger:
         message = {"endpoint": "task_stop", "task_name": task_name, "model": model}
         return self._invoke_service(message=message)
 
+    def task_participants(self, task_name: str) -> list:
+        """
+        As a task creator, returns the participants of the given task.
+        Throws: An exception on failure
+        :param task_name: name of the task
+        :type task_name: `str`
+        :return: list of the task participants
+        :rtype: `list`
+        """
+        message = {"endpoint": "task_participants", "task_name": task_name}
+        return self._invoke_service(message)
+
     def user_assignments(self) -> list:
         """
         Returns all the tasks the user is participating in.
@@ -262,13 +446,17 @@ class Messenger:
         message = {"endpoint": "model_lineage", "task_name": task_name}
         return self._invoke_service(message)
 
-    def model_info(self, task_name: str) -> dict:
+    def model_info(self, task_name: str, sink=None) -> dict:
         """
         Returns model info.
         Throws: An exception on failure
+        :param sink: when given, the model is streamed in chunks into this binary file instead
         :return: dict of model info
         :rtype: `dict`
         """
+        if sink is not None:
+            return self.download_model(task_name, sink)
+
         message = {"endpoint": "model_info", "task_name": task_name}
         return self._invoke_service(message)
 
@@ -340,6 +528,8 @@ class BasicParticipant:
 class BasicParticipant:
     """ Base class for an FFL general user """
 
+    messenger_class = Messenger
+
     def __init__(self, context: Context):
         """
         Class initializer.
@@ -351,7 +541,7 @@ class BasicParticipant:
             raise Exception('Credentials must be specified.')
 
         self.context = context
-        self.messenger = Messenger(self.context)
+        self.messenger = self.messenger_class(self.context)
 
     def __enter__(self):
         return self
@@ -474,14 +664,15 @@ class User(fflabc.AbstractUser, BasicParticipant):
         """
         return self.messenger.model_listing()
 
-    def get_model(self, task_name: str) -> list:
+    def get_model(self, task_name: str, sink=None) -> list:
         """
         Returns a list with all the available trained models.
         Throws: An exception on failure
+        :param sink: when given, the model is streamed in chunks into this binary file instead
         :return: list of all the available models
         :rtype: `list`
         """
-        return self.messenger.model_info(task_name)
+        return self.messenger.model_info(task_name, sink)
 
     def model_lineage(self, task_name: str) -> list:
         """
@@ -521,7 +712,6 @@ class Participant(fflabc.AbstractParticipant, BasicParticipant):
         super().__init__(context)
 
         self.task_name = task_name
-        self.messenger = Messenger(self.context)
 
     def send(self, message: dict = None):
         """
@@ -539,7 +729,7 @@ class Participant(fflabc.AbstractParticipant, BasicParticipant):
         :return: received message
         :rtype: `class Response`
         """
-        return self.messenger.receive()
+        return self.messenger.receive(self.task_name, "participant")
 
     def leave_task(self):
         """
@@ -570,7 +760,9 @@ class Aggregator(fflabc.AbstractAggregator, BasicParticipant):
         super().__init__(context)
 
         self.task_name = task_name
-        self.messenger = Messenger(self.context)
+
+        # Replies of concurrent receives that arrived after their caller stopped waiting
+        self._backlog = collections.deque()
 
     def send(self, message: dict = None, participant: str = None, topology: str = None):
         """
@@ -579,7 +771,42 @@ class Aggregator(fflabc.AbstractAggregator, BasicParticipant):
         :param message: message to be sent
         :type message: `dict`
         """
-        self.messenger.send(message, self.task_name, "aggregator", participant, topology)
+        return self.messenger.send(message, self.task_name, "aggregator", participant, topology)
+
+    def send_many(self, messages: dict = None, broadcast: dict = None, topology: str = None) -> dict:
+        """
+        Send a batch of messages concurrently and return once all of them are delivered.
+        The shared 'broadcast' payload is serialized and sent once, addressed to all the
+        participants, while each entry of 'messages' is sent to its own participant.
+        Failures do not interrupt the batch, they are reported per participant.
+        :param messages: participant name -> message to be sent to that participant only
+        :type messages: `dict`
+        :param broadcast: message to be sent to all the participants
+        :type broadcast: `dict`
+        :param topology: topology of the task participants' communication network
+        :type topology: `str`
+        :return: participant name -> :class:`.SendReport`, the broadcast is reported under None
+        :rtype: `dict`
+        """
+        sends = dict(messages or {})
+        if broadcast is not None:
+            sends[None] = broadcast
+
+        executor = self.context.transport.executor
+        futures = {participant: executor.submit(self._timed_send, message, participant, topology)
+                   for participant, message in sends.items()}
+
+        return {participant: future.result() for participant, future in futures.items()}
+
+    def _timed_send(self, message: dict, participant: str, topology: str) -> SendReport:
+
+        start = time.monotonic()
+        try:
+            self.messenger.send(message, self.task_name, "aggregator", participant, topology)
+        except Exception as err:
+            LOGGER.error('Send to %s failed: %s', participant or 'all participants', err)
+            return SendReport(False, time.monotonic() - start, err)
+        return SendReport(True, time.monotonic() - start)
 
     def receive(self):
         """
@@ -588,4 +815,267 @@ class Aggregator(fflabc.AbstractAggregator, BasicParticipant):
         :return: received message
         :rtype: `class Response`
         """
+        if self._backlog:
+            return self._backlog.popleft()
         return self.messenger.receive(self.task_name, "aggregator")
+
+    def iter_receive(self, count: int, timeout: float = None):
+        """
+        Keep up to 'count' receive requests in flight and yield the messages as they arrive,
+        so that waiting for N participants costs the slowest reply instead of the sum of them.
+        The iteration stops after 'count' messages or when 'timeout' expires; replies landing
+        afterwards are kept and returned by the next receive calls.
+        Throws: An exception on failure
+        :param count: number of messages to wait for
+        :type count: `int`
+        :param timeout: overall timeout in seconds (None waits forever)
+        :type timeout: `float`
+        :return: iterator over the received messages
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        received = 0
+
+        while received < count and self._backlog:
+            received += 1
+            yield self._backlog.popleft()
+
+        executor = self.context.transport.executor
+        in_flight = set()
+        try:
+            while received < count:
+                while len(in_flight) < count - received:
+                    in_flight.add(executor.submit(self.messenger.receive, self.task_name, "aggregator"))
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+
+                done, in_flight = wait(in_flight, timeout=remaining, return_when=FIRST_COMPLETED)
+                # Keep every completed reply before reporting a failure, so none is lost
+                error = self._keep_replies(done)
+                while received < count and self._backlog:
+                    received += 1
+                    yield self._backlog.popleft()
+                if error is not None:
+                    raise error
+        finally:
+            for future in in_flight:
+                if not future.cancel():
+                    future.add_done_callback(self._keep_late_reply)
+
+    def receive_many(self, count: int, timeout: float = None) -> list:
+        """
+        Receive up to 'count' messages concurrently, see :meth:`iter_receive`.
+        Throws: An exception on failure
+        :param count: number of messages to wait for
+        :type count: `int`
+        :param timeout: overall timeout in seconds (None waits forever)
+        :type timeout: `float`
+        :return: received messages, in arrival order (fewer than 'count' on timeout)
+        :rtype: `list`
+        """
+        return list(self.iter_receive(count, timeout))
+
+    def _keep_replies(self, futures) -> Exception:
+
+        error = None
+        for future in futures:
+            if future.exception() is None:
+                self._backlog.append(future.result())
+            elif error is None:
+                error = future.exception()
+            else:
+                LOGGER.error('Receive failed: %s', future.exception())
+        return error
+
+    def _keep_late_reply(self, future) -> None:
+
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            LOGGER.error('Late receive failed: %s', future.exception())
+            return
+        self._backlog.append(future.result())
+
+    def get_participants(self) -> list:
+        """
+        Return a list of participants.
+        Throws: An exception on failure
+        :return: list of participants
+        :rtype: `list`
+        """
+        return self.messenger.task_participants(self.task_name)
+
+    def stop_task(self, model: dict = None) -> None:
+        """
+        As a task creator, stop the given task.
+        The status of the task will be changed to 'COMPLETE'.
+        Throws: An exception on failure
+        :param model: final model to be published with the task
+        :type model: `dict`
+        """
+        return self.messenger.task_stop(self.task_name, model)
+
+##########################################################################
+
+
+##########################################################################
+# Asyncio variants of the messenger and of the platform users ############
+
+class AsyncMessenger(Messenger):
+    """
+    Messenger whose service calls are awaitable.
+    Requests are run on the worker threads of the context transport, so every
+    coroutine shares the same connection pool and at most 'pool_size' calls
+    are on the wire at once.
+    """
+
+    async def _invoke_service(self, message: dict) -> dict:
+        """
+        Send a message and wait for a reply or until timeout, without blocking the event loop.
+        Throws: An exception on failure
+        :param message: message to be sent
+        :type message: `dict`
+        :return: received message
+        :rtype: `dict`
+        """
+        loop = _running_loop()
+        call = functools.partial(Messenger._invoke_service, self, message)
+        return await loop.run_in_executor(self.context.transport.executor, call)
+
+    async def upload_model(self, task_name: str, source) -> dict:
+        """
+        Awaitable version of :meth:`.Messenger.upload_model`
+        """
+        loop = _running_loop()
+        call = functools.partial(Messenger.upload_model, self, task_name, source)
+        return await loop.run_in_executor(self.context.transport.executor, call)
+
+    async def download_model(self, task_name: str, sink) -> dict:
+        """
+        Awaitable version of :meth:`.Messenger.download_model`
+        """
+        loop = _running_loop()
+        call = functools.partial(Messenger.download_model, self, task_name, sink)
+        return await loop.run_in_executor(self.context.transport.executor, call)
+
+
+class AsyncBasicParticipant(BasicParticipant):
+    """ Base class for an FFL general user with awaitable methods """
+
+    messenger_class = AsyncMessenger
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, ex_type, ex_val, tb):
+        if ex_type is None:
+            return True
+
+
+class AsyncUser(AsyncBasicParticipant, User):
+    """ Awaitable version of :class:`.User` """
+
+
+class AsyncParticipant(AsyncBasicParticipant, Participant):
+    """ Awaitable version of :class:`.Participant` """
+
+
+class AsyncAggregator(AsyncBasicParticipant, Aggregator):
+    """ Awaitable version of :class:`.Aggregator` """
+
+    async def send_many(self, messages: dict = None, broadcast: dict = None, topology: str = None) -> dict:
+        """
+        Awaitable version of :meth:`.Aggregator.send_many`.
+        :param messages: participant name -> message to be sent to that participant only
+        :type messages: `dict`
+        :param broadcast: message to be sent to all the participants
+        :type broadcast: `dict`
+        :param topology: topology of the task participants' communication network
+        :type topology: `str`
+        :return: participant name -> :class:`.SendReport`, the broadcast is reported under None
+        :rtype: `dict`
+        """
+        sends = dict(messages or {})
+        if broadcast is not None:
+            sends[None] = broadcast
+
+        participants = list(sends)
+        reports = await asyncio.gather(*[self._timed_send(sends[participant], participant, topology)
+                                         for participant in participants])
+        return dict(zip(participants, reports))
+
+    async def _timed_send(self, message: dict, participant: str, topology: str) -> SendReport:
+
+        loop = _running_loop()
+        start = loop.time()
+        try:
+            await self.messenger.send(message, self.task_name, "aggregator", participant, topology)
+        except Exception as err:
+            LOGGER.error('Send to %s failed: %s', participant or 'all participants', err)
+            return SendReport(False, loop.time() - start, err)
+        return SendReport(True, loop.time() - start)
+
+    async def receive(self):
+        """
+        Wait for a message to arrive or until timeout period is exceeded.
+        Throws: An exception on failure
+        :return: received message
+        :rtype: `class Response`
+        """
+        if self._backlog:
+            return self._backlog.popleft()
+        return await self.messenger.receive(self.task_name, "aggregator")
+
+    async def iter_receive(self, count: int, timeout: float = None):
+        """
+        Asynchronous iterator version of :meth:`.Aggregator.iter_receive`.
+        Throws: An exception on failure
+        :param count: number of messages to wait for
+        :type count: `int`
+        :param timeout: overall timeout in seconds (None waits forever)
+        :type timeout: `float`
+        """
+        loop = _running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        received = 0
+
+        while received < count and self._backlog:
+            received += 1
+            yield self._backlog.popleft()
+
+        in_flight = set()
+        try:
+            while received < count:
+                while len(in_flight) < count - received:
+                    in_flight.add(asyncio.ensure_future(self.messenger.receive(self.task_name, "aggregator")))
+
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+
+                done, in_flight = await asyncio.wait(in_flight, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                # Keep every completed reply before reporting a failure, so none is lost
+                error = self._keep_replies(done)
+                while received < count and self._backlog:
+                    received += 1
+                    yield self._backlog.popleft()
+                if error is not None:
+                    raise error
+        finally:
+            # The requests are already on the wire: let them complete and keep their replies
+            for future in in_flight:
+                future.add_done_callback(self._keep_late_reply)
+
+    async def receive_many(self, count: int, timeout: float = None) -> list:
+        """
+        Receive up to 'count' messages concurrently, see :meth:`.Aggregator.iter_receive`.
+        Throws: An exception on failure
+        :param count: number of messages to wait for
+        :type count: `int`
+        :param timeout: overall timeout in seconds (None waits forever)
+        :type timeout: `float`
+        :return: received messages, in arrival order (fewer than 'count' on timeout)
+        :rtype: `list`
+        """
+        return [message async for message in self.iter_receive(count, timeout)]
@@ -0,0 +1,198 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+-------------------------
+
+Binary multipart encoding of the messenger payloads.
+
+Bytes-like values found in a message are not embedded in the JSON document: each of them
+is replaced by a {"__binary_part__": <name>} reference and travels as a raw
+'application/octet-stream' part of a multipart/form-data body, next to the JSON 'payload' part.
+When the data app accepts multipart messages, the models of send_message, task_start and
+task_stop are pickled to bytes to be sent this way, and unpickled from the replies.
+"""
+
+import email.parser
+import json
+import pickle
+import uuid
+
+
+BINARY_PART_KEY = '__binary_part__'
+PAYLOAD_PART = 'payload'
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Field of the message holding the model, per endpoint
+BINARY_FIELDS = {'send_message': 'message', 'task_start': 'model', 'task_stop': 'model'}
+# Fields of a reply that may hold a model sent as a binary part
+BINARY_REPLY_FIELDS = ('message', 'model')
+
+
+def to_binary(value) -> bytes:
+    """
+    Serialize a model to be sent as a binary part
+    :param value: model or message
+    :return: pickled bytes
+    :rtype: `bytes`
+    """
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def from_binary(reply):
+    """
+    Deserialize the models of a reply received as binary parts (see :func:`to_binary`)
+    :param reply: decoded reply of the data app
+    :return: the reply, with its models deserialized
+    """
+    if isinstance(reply, dict):
+        for field in BINARY_REPLY_FIELDS:
+            if isinstance(reply.get(field), bytes):
+                reply[field] = pickle.loads(reply[field])
+    return reply
+
+
+def encode_payload(payload: dict):
+    """
+    Serialize 'payload' to JSON, moving the bytes-like values out of the document.
+    Throws: An exception on failure
+    :param payload: message to be sent
+    :type payload: `dict`
+    :return: the UTF-8 JSON body and the list of (name, bytes-like) binary parts
+    :rtype: `tuple`
+    """
+    parts = []
+
+    def binary_reference(value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            name = 'part-%d' % len(parts)
+            parts.append((name, value))
+            return {BINARY_PART_KEY: name}
+        raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+    body = json.dumps(payload, default=binary_reference).encode('utf-8')
+    return body, parts
+
+
+class MultipartStream:
+    """
+    File-like multipart/form-data body read straight from the buffers of the parts.
+    Its length is known in advance, so it is sent with a Content-Length header
+    without ever being joined into a single bytes object.
+    """
+
+    def __init__(self, body: bytes, parts: list):
+        """
+        Class initializer
+        :param body: UTF-8 JSON 'payload' part
+        :type body: `bytes`
+        :param parts: (name, bytes-like) binary parts
+        :type parts: `list`
+        """
+        self.boundary = uuid.uuid4().hex
+        self._segments = []
+
+        self._add_part(PAYLOAD_PART, 'application/json', body)
+        for name, value in parts:
+            self._add_part(name, 'application/octet-stream', value)
+        self._segments.append(('--%s--\r\n' % self.boundary).encode('ascii'))
+
+        self._length = sum(len(segment) for segment in self._segments)
+        self._index = 0
+        self._offset = 0
+
+    def _add_part(self, name: str, content_type: str, value) -> None:
+
+        header = '--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n' \
+                 'Content-Type: %s\r\n\r\n' % (self.boundary, name, name, content_type)
+        self._segments.append(header.encode('ascii'))
+        self._segments.append(memoryview(value).cast('B'))
+        self._segments.append(b'\r\n')
+
+    @property
+    def content_type(self) -> str:
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+
+        while size > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            chunk = segment[self._offset:self._offset + size]
+            chunks.append(bytes(chunk))
+            size -= len(chunk)
+            self._offset += len(chunk)
+            if self._offset >= len(segment):
+                self._index += 1
+                self._offset = 0
+
+        return b''.join(chunks)
+
+    def __iter__(self):
+
+        while True:
+            chunk = self.read(STREAM_BLOCK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def decode_response(response) -> dict:
+    """
+    Decode a data app reply, either plain JSON or a multipart body carrying binary parts.
+    Throws: An exception on failure
+    :param response: response of the data app
+    :type response: :class:`requests.Response`
+    :return: received message, with the binary references replaced by `bytes`
+    :rtype: `dict`
+    """
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith('multipart/'):
+        return response.json()
+
+    head = ('Content-Type: %s\r\nMIME-Version: 1.0\r\n\r\n' % content_type).encode('ascii')
+    message = email.parser.BytesParser().parsebytes(head + response.content)
+
+    document = None
+    parts = {}
+    for part in message.get_payload():
+        name = part.get_param('name', header='Content-Disposition')
+        if name == PAYLOAD_PART:
+            document = part.get_payload(decode=True)
+        else:
+            parts[name] = part.get_payload(decode=True)
+
+    if document is None:
+        raise ValueError("Multipart reply without a '%s' part" % PAYLOAD_PART)
+
+    def binary_value(obj):
+        if len(obj) == 1 and BINARY_PART_KEY in obj:
+            return parts[obj[BINARY_PART_KEY]]
+        return obj
+
+    return json.loads(document.decode('utf-8'), object_hook=binary_value)
@@ -0,0 +1,207 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+import urllib3
+
+
+LOGGER = logging.getLogger(__package__)
+
+# Endpoints that can be sent again without side effects. The others (e.g. 'send_message', whose
+# duplicates would deliver the same update twice) are retried only when the request was never sent
+IDEMPOTENT_ENDPOINTS = frozenset([
+    'connect', 'task_listing', 'task_info', 'task_participants', 'user_assignments', 'user_tasks',
+    'model_listing', 'model_info', 'model_lineage',
+    'model_upload_status', 'model_upload_chunk', 'model_download_info', 'model_download_chunk'
+])
+
+# Read-only endpoints, for which a slow request may be raced by a duplicate one
+HEDGED_ENDPOINTS = frozenset([
+    'task_listing', 'task_info', 'task_participants', 'user_assignments', 'user_tasks',
+    'model_listing', 'model_lineage'
+])
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504)
+
+# Requests in flight at once for the hedged calls (a primary and its duplicate each take one)
+HEDGE_WORKERS = 8
+
+
+def never_sent(err: Exception) -> bool:
+    """
+    Whether a failed request surely never reached the server (no connection could be opened)
+    :param err: error raised by the request
+    :type err: `Exception`
+    :rtype: `bool`
+    """
+    if isinstance(err, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(err, requests.ConnectionError) and err.args:
+        reason = getattr(err.args[0], 'reason', None)
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+class RetryPolicy:
+    """
+    Retries failed calls of idempotent endpoints with exponential backoff and full jitter,
+    and optionally hedges slow read-only calls with a duplicate request.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Class initializer
+        :param config: connection details; optional keys are 'retries' (attempts after the first one),
+                       'backoff_base' and 'backoff_max' (seconds), 'retry_statuses' (HTTP statuses
+                       worth a retry) and 'hedge_delay' (seconds before a duplicate of a read-only
+                       request is sent, disabled if missing)
+        :type config: `dict`
+        """
+        self.retries = int(config.get('retries', DEFAULT_RETRIES))
+        self.backoff_base = float(config.get('backoff_base', DEFAULT_BACKOFF_BASE))
+        self.backoff_max = float(config.get('backoff_max', DEFAULT_BACKOFF_MAX))
+        self.retry_statuses = frozenset(config.get('retry_statuses', DEFAULT_RETRY_STATUSES))
+        self.hedge_delay = config.get('hedge_delay', None)
+
+        self._lock = threading.Lock()
+        self._hedge_executor = None
+        self._hedge_busy = 0
+        self._stats = {}
+
+    def _count(self, endpoint: str, counter: str) -> None:
+
+        with self._lock:
+            counters = self._stats.setdefault(endpoint, {"calls": 0, "retries": 0, "failures": 0,
+                                                         "hedges": 0, "hedge_wins": 0})
+            counters[counter] += 1
+
+    def is_retriable(self, err: Exception, idempotent: bool = True) -> bool:
+        """
+        Whether a failed attempt is worth a retry
+        :param err: error raised by the attempt
+        :type err: `Exception`
+        :param idempotent: whether the request can be sent twice, otherwise only the requests
+                           that never reached the server are retried
+        :type idempotent: `bool`
+        :rtype: `bool`
+        """
+        if not idempotent:
+            return never_sent(err)
+        if isinstance(err, (requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(err, requests.HTTPError) and err.response is not None:
+            return err.response.status_code in self.retry_statuses
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before the given retry (1-based), with full jitter
+        :rtype: `float`
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+    def call(self, endpoint: str, attempt):
+        """
+        Run 'attempt' applying the policy of 'endpoint'.
+        Throws: the error of the last attempt
+        :param endpoint: service endpoint
+        :type endpoint: `str`
+        :param attempt: function performing one request and returning its result
+        :return: the result of the first successful attempt
+        """
+        self._count(endpoint, "calls")
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+        hedged = self.hedge_delay is not None and endpoint in HEDGED_ENDPOINTS
+
+        for retry in range(self.retries + 1):
+            try:
+                return self._hedged(endpoint, attempt) if hedged else attempt()
+            except Exception as err:
+                if retry == self.retries or not self.is_retriable(err, idempotent):
+                    self._count(endpoint, "failures")
+                    raise
+                delay = self.backoff(retry + 1)
+                LOGGER.warning('%s failed (%s), retry %d of %d in %.2fs', endpoint, err, retry + 1, self.retries, delay)
+                self._count(endpoint, "retries")
+                time.sleep(delay)
+
+    def _hedged(self, endpoint: str, attempt):
+
+        # Each request is bounded by the transport timeout; while the pool is taken by slow
+        # requests, the call is sent without a duplicate instead of queueing behind them
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+            executor = self._hedge_executor
+            if self._hedge_busy + 2 > HEDGE_WORKERS:
+                executor = None
+            else:
+                self._hedge_busy += 2
+
+        if executor is None:
+            return attempt()
+
+        primary = executor.submit(attempt)
+        primary.add_done_callback(self._hedge_done)
+        done, _ = wait([primary], timeout=float(self.hedge_delay))
+        if done:
+            self._hedge_done(None)
+            return primary.result()
+
+        self._count(endpoint, "hedges")
+        hedge = executor.submit(attempt)
+        hedge.add_done_callback(self._hedge_done)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(endpoint, "hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge_done(self, future) -> None:
+
+        with self._lock:
+            self._hedge_busy -= 1
+
+    def stats(self) -> dict:
+        """
+        Returns per endpoint counters of calls, retries, failures and hedged requests
+        :return: endpoint -> counters
+        :rtype: `dict`
+        """
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
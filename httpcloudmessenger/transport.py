@@ -0,0 +1,271 @@
+"""
+Please note that the following code was developed for the project MUSKETEER in DRL funded by
+the European Union under the Horizon 2020 Program.
+The project started on 01/12/2018 and will be / was completed on 30/11/2021. Thus, in accordance
+with article 30.3 of the Multi-Beneficiary General Model Grant Agreement of the Program, the above
+limitations are in force until 30/11/2025.
+
+Author: Engineering - Ingegneria Informatica S.p.A. (musketeer-team@eng.it).
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from httpcloudmessenger.compression import PayloadCompressor
+from httpcloudmessenger.multipart import MultipartStream
+from httpcloudmessenger.retry import RetryPolicy
+
+
+LOGGER = logging.getLogger(__package__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Longer than the wait of a 'receive_message' held by the data app until a message arrives
+DEFAULT_READ_TIMEOUT = 600.0
+
+
+class _ConnectionCounter:
+    """
+    Thread safe counter of the TCP (and TLS) connections opened by a transport
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def increment(self):
+        with self._lock:
+            self.value += 1
+
+
+def _counting_pool_class(base, counter: _ConnectionCounter):
+    """
+    Build a urllib3 connection pool class that reports every new connection to 'counter'
+    """
+
+    class CountingConnectionPool(base):
+
+        def _new_conn(self):
+            counter.increment()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    HTTP adapter whose connection pools count the connections they open
+    """
+
+    def __init__(self, counter: _ConnectionCounter, **kwargs):
+        self._counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self._counter),
+            'https': _counting_pool_class(HTTPSConnectionPool, self._counter)
+        }
+
+
+class Transport:
+    """
+    Long-lived HTTP transport towards the data app.
+    A single instance is owned by a Context and shared, from any thread, by all the
+    messengers built on it, so that keep-alive connections (and their TLS sessions)
+    are reused across calls instead of being re-established for every request.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Class initializer
+        :param config: connection details; optional keys are 'pool_size' (max connections
+                       kept per host), 'pool_block' (wait for a free connection instead of
+                       opening an extra one), 'keep_alive', 'verify', 'connect_timeout' and
+                       'read_timeout' (seconds), the compression
+                       settings of :class:`.PayloadCompressor` and the retry settings of
+                       :class:`.RetryPolicy`
+        :type config: `dict`
+        """
+        self.pool_size = int(config.get('pool_size', DEFAULT_POOL_SIZE))
+        self.pool_block = bool(config.get('pool_block', False))
+        self.keep_alive = bool(config.get('keep_alive', True))
+        self.verify = config.get('verify', False)
+        self.timeout = (float(config.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT)),
+                        float(config.get('read_timeout', DEFAULT_READ_TIMEOUT)))
+        self.compressor = PayloadCompressor(config)
+        self.retry_policy = RetryPolicy(config)
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+        self._connections = _ConnectionCounter()
+        self._requests = 0
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The pooled session, created on first use
+        :rtype: :class:`requests.Session`
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Worker threads, one per pooled connection, used to keep several
+        requests in flight at once (e.g. by the asyncio messenger)
+        :rtype: :class:`concurrent.futures.ThreadPoolExecutor`
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+            return self._executor
+
+    def _create_session(self) -> requests.Session:
+
+        session = requests.Session()
+        adapter = _PooledAdapter(self._connections, pool_connections=self.pool_size,
+                                 pool_maxsize=self.pool_size, pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'content-type': 'application/json'})
+        if not self.keep_alive:
+            session.headers.update({'Connection': 'close'})
+
+        LOGGER.debug('HTTP transport created (pool size %d)', self.pool_size)
+        return session
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        POST through the pooled session.
+        Throws: An exception on failure
+        :param url: target url
+        :type url: `str`
+        :return: the response
+        :rtype: :class:`requests.Response`
+        """
+        return self._post(url, True, **kwargs)
+
+    def _post(self, url: str, count: bool, **kwargs) -> requests.Response:
+
+        kwargs.setdefault('verify', self.verify)
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session
+
+        if count:
+            with self._lock:
+                self._requests += 1
+
+        return session.post(url, **kwargs)
+
+    def post_json(self, url: str, body: bytes, endpoint: str) -> requests.Response:
+        """
+        POST a serialized JSON body, compressed when large enough and accepted by the data app.
+        A coding refused with HTTP 415 is disabled and the request is sent again (accounted once).
+        Throws: An exception on failure
+        :param url: target url
+        :type url: `str`
+        :param body: UTF-8 JSON body
+        :type body: `bytes`
+        :param endpoint: service endpoint, used for the statistics
+        :type endpoint: `str`
+        :return: the response
+        :rtype: :class:`requests.Response`
+        """
+        resent = False
+        while True:
+            data, encoding, seconds = self.compressor.encode(body)
+            headers = {'Accept-Encoding': self.compressor.accept_encoding()}
+            if encoding is not None:
+                headers['Content-Encoding'] = encoding
+
+            response = self._post(url, not resent, data=data, headers=headers)
+            if response.status_code == 415 and encoding is not None:
+                self.compressor.reject(encoding)
+                resent = True
+                continue
+
+            self.compressor.negotiate(response)
+            self.compressor.record_request(endpoint, len(body), len(data), seconds)
+            self.compressor.record_response(endpoint, response)
+            return response
+
+    def post_multipart(self, url: str, body: bytes, parts: list, endpoint: str) -> requests.Response:
+        """
+        POST a JSON body together with raw binary parts as multipart/form-data,
+        streaming the parts from their buffers.
+        Throws: An exception on failure
+        :param url: target url
+        :type url: `str`
+        :param body: UTF-8 JSON body
+        :type body: `bytes`
+        :param parts: (name, bytes-like) binary parts
+        :type parts: `list`
+        :param endpoint: service endpoint, used for the statistics
+        :type endpoint: `str`
+        :return: the response
+        :rtype: :class:`requests.Response`
+        """
+        stream = MultipartStream(body, parts)
+        headers = {'Accept-Encoding': self.compressor.accept_encoding(),
+                   'content-type': stream.content_type}
+
+        response = self.post(url, data=stream, headers=headers)
+
+        self.compressor.record_request(endpoint, len(stream))
+        self.compressor.record_response(endpoint, response)
+        return response
+
+    def stats(self) -> dict:
+        """
+        Returns the number of requests sent, how many of them opened a new connection
+        rather than reusing a pooled one, and per endpoint payload sizes and retries.
+        :return: transport counters
+        :rtype: `dict`
+        """
+        with self._lock:
+            requests_sent = self._requests
+        new_connections = self._connections.value
+
+        return {"requests": requests_sent,
+                "new_connections": new_connections,
+                "reused_connections": max(requests_sent - new_connections, 0),
+                "endpoints": self.compressor.stats(),
+                "retries": self.retry_policy.stats()}
+
+    def close(self) -> None:
+        """
+        Close every pooled connection. The transport can still be used afterwards,
+        a new session is created on the next request.
+        """
+        with self._lock:
+            session, self._session = self._session, None
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if session is not None:
+            session.close()